@@ -1 +1,65 @@
 # -*- coding: utf-8 -*-
+"""
+通用方法抽象
+
+顶层名称按需导入，import methods 本身不会加载 pandas、numpy、aredis 等依赖
+
+    import methods
+    methods.read_json('template.json')
+    methods.dt.date2int(methods.dt.now())
+"""
+import importlib
+
+_SUBMODULES = (
+    'afiles', 'blob', 'bridge', 'decorate', 'dt', 'exceptions', 'files', 'keyspace', 'lazy', 'logger',
+    'probabilistic', 'pubsub', 'redis', 'timeseries', 'writebehind',
+)
+
+_ATTRIBUTES = {
+    'MethodException': 'exceptions',
+    'get_logger': 'logger',
+    'setup_logging': 'logger',
+    'profile': 'decorate',
+    'cached': 'decorate',
+    'open_file': 'files',
+    'read_csv': 'files',
+    'save_csv': 'files',
+    'pd_read_csv': 'files',
+    'pd_save_csv': 'files',
+    'read_json': 'files',
+    'save_json': 'files',
+    'read_txt': 'files',
+    'save_txt': 'files',
+    'aread_csv': 'afiles',
+    'asave_csv': 'afiles',
+    'aread_json': 'afiles',
+    'asave_json': 'afiles',
+    'aread_txt': 'afiles',
+    'asave_txt': 'afiles',
+    'aiter_txt': 'afiles',
+    'Calendar': 'dt',
+    'RedisClient': 'redis',
+    'Subscriber': 'pubsub',
+    'TimeSeries': 'timeseries',
+    'BloomFilter': 'probabilistic',
+    'WriteBehind': 'writebehind',
+    'BlobStore': 'blob',
+    'analyze_keyspace': 'keyspace',
+}
+
+__all__ = list(_SUBMODULES) + list(_ATTRIBUTES)
+
+
+def __getattr__(name: str):
+    if name in _SUBMODULES:
+        module = importlib.import_module(f'{__name__}.{name}')
+    elif name in _ATTRIBUTES:
+        module = getattr(importlib.import_module(f'{__name__}.{_ATTRIBUTES[name]}'), name)
+    else:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    globals()[name] = module
+    return module
+
+
+def __dir__() -> list:
+    return sorted(set(globals()) | set(__all__))
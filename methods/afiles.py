@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+"""
+methods.files 的异步版本
+
+所有磁盘操作都在有界线程池中执行，并按块读写，避免阻塞事件循环
+"""
+from __future__ import annotations
+
+import asyncio
+import csv
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from itertools import islice
+from typing import AsyncIterator
+
+from methods.exceptions import MethodException
+from methods.files import (
+    iter_csv,
+    iter_txt,
+    open_file,
+    pd_read_csv,
+    pd_save_csv,
+    read_json,
+    save_json,
+)
+from methods.lazy import lazy_import
+
+pd = lazy_import('pandas')
+
+# 线程池大小
+MAX_WORKERS = 4
+# 同时进行的磁盘操作上限
+MAX_CONCURRENCY = 4
+# 每次读写的行数
+CHUNK_SIZE = 10000
+
+_executor = None
+_semaphores = weakref.WeakKeyDictionary()
+
+
+def set_io_limits(max_workers: int = None, max_concurrency: int = None) -> None:
+    """
+    设置线程池大小及并发磁盘操作上限，需要在首次调用异步读写之前设置
+    """
+    global MAX_WORKERS, MAX_CONCURRENCY
+    if max_workers:
+        MAX_WORKERS = max_workers
+    if max_concurrency:
+        MAX_CONCURRENCY = max_concurrency
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix='methods-io')
+    return _executor
+
+
+def shutdown_executor(wait=True) -> None:
+    """
+    关闭磁盘操作线程池
+    """
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=wait)
+        _executor = None
+
+
+def _io_semaphore() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    semaphore = _semaphores.get(loop)
+    if semaphore is None:
+        semaphore = _semaphores[loop] = asyncio.Semaphore(MAX_CONCURRENCY)
+    return semaphore
+
+
+async def run_io(func, *args, **kwargs):
+    """
+    在磁盘操作线程池中执行阻塞函数，受并发上限约束
+    """
+    async with _io_semaphore():
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_get_executor(), partial(func, *args, **kwargs))
+
+
+def _take(iterator, size: int) -> list:
+    return list(islice(iterator, size))
+
+
+def _write_lines(fw, lines: list) -> None:
+    fw.write(''.join(f'{line}\n' for line in lines))
+
+
+def _abort(fw) -> None:
+    if hasattr(fw, 'discard'):
+        fw.discard()
+    else:
+        fw.close()
+
+
+async def _aiter_chunks(iterator, chunk_size: int) -> AsyncIterator:
+    pending = None
+    try:
+        while True:
+            # 取消时磁盘线程中的读取不会中断，保留引用以便关闭前等待其结束
+            pending = asyncio.ensure_future(run_io(_take, iterator, chunk_size))
+            chunk = await asyncio.shield(pending)
+            pending = None
+            if not chunk:
+                break
+            for item in chunk:
+                yield item
+    finally:
+        if pending is not None:
+            await asyncio.wait([pending])
+            if not pending.cancelled():
+                pending.exception()
+        iterator.close()
+
+
+def aiter_csv(filename: str, encoding='utf-8', compression='infer', chunk_size=CHUNK_SIZE, **kwargs) -> AsyncIterator:
+    """
+    逐行异步读取 csv 文件
+    """
+    return _aiter_chunks(iter_csv(filename, encoding=encoding, compression=compression, **kwargs), chunk_size)
+
+
+async def aread_csv(filename: str, encoding='utf-8', compression='infer', chunk_size=CHUNK_SIZE, **kwargs) -> list:
+    return [row async for row in aiter_csv(filename, encoding, compression, chunk_size, **kwargs)]
+
+
+async def asave_csv(
+        rows: list, filename='template.csv', headers=None, encoding='utf-8',
+        compression='infer', level=None, threads=0, atomic=False, chunk_size=CHUNK_SIZE,
+) -> None:
+    fw = await run_io(
+        open_file, filename, 'w', encoding=encoding, newline='', compression=compression, level=level,
+        threads=threads, atomic=atomic,
+    )
+    try:
+        writer = csv.writer(fw)
+        if headers:
+            await run_io(writer.writerow, headers)
+        for start in range(0, len(rows), chunk_size):
+            await run_io(writer.writerows, rows[start:start + chunk_size])
+    except BaseException:
+        await run_io(_abort, fw)
+        raise
+    await run_io(fw.close)
+
+
+async def apd_read_csv(filename: str, compression='infer', cache=False, cache_dir=None, **kwargs) -> pd.DataFrame:
+    return await run_io(pd_read_csv, filename, compression=compression, cache=cache, cache_dir=cache_dir, **kwargs)
+
+
+async def apd_save_csv(df: pd.DataFrame, filename='template.csv', **kwargs) -> None:
+    await run_io(pd_save_csv, df, filename, **kwargs)
+
+
+async def aread_json(filename: str, encoding='utf-8', compression='infer') -> dict:
+    return await run_io(read_json, filename, encoding=encoding, compression=compression)
+
+
+async def asave_json(row: dict, filename='template.json', **kwargs) -> None:
+    await run_io(save_json, row, filename, **kwargs)
+
+
+def aiter_txt(
+        filename: str, mode='r', encoding='utf-8', errors='ignore', compression='infer', chunk_size=CHUNK_SIZE,
+) -> AsyncIterator:
+    """
+    逐行异步读取文本文件，跳过空行
+    """
+    return _aiter_chunks(
+        iter_txt(filename, mode=mode, encoding=encoding, errors=errors, compression=compression), chunk_size
+    )
+
+
+async def aread_txt(
+        filename: str, mode='r', encoding='utf-8', errors='ignore', compression='infer', chunk_size=CHUNK_SIZE,
+) -> list:
+    return [line async for line in aiter_txt(filename, mode, encoding, errors, compression, chunk_size)]
+
+
+async def asave_txt(
+        row, filename='template.txt', mode='w', encoding='utf-8', errors='ignore',
+        compression='infer', level=None, threads=0, atomic=False, chunk_size=CHUNK_SIZE,
+) -> None:
+    if not isinstance(row, (str, list)):
+        raise MethodException('待保存内容不合法')
+    if isinstance(row, str):
+        row = [row]
+    fw = await run_io(
+        open_file, filename, mode=mode, encoding=encoding, errors=errors,
+        compression=compression, level=level, threads=threads, atomic=atomic,
+    )
+    try:
+        for start in range(0, len(row), chunk_size):
+            await run_io(_write_lines, fw, row[start:start + chunk_size])
+    except BaseException:
+        await run_io(_abort, fw)
+        raise
+    await run_io(fw.close)
@@ -0,0 +1,336 @@
+# -*- coding: utf-8 -*-
+"""
+methods.files 与 methods.dt 热点函数的基准测试
+
+为每个函数及其流式/向量化版本生成指定规模的合成数据（文件、日期区间），
+测量延迟（最小/中位/p90/平均）、吞吐量（条/秒）及峰值内存（tracemalloc），
+结果保存为 json，并可与保存的基线比较，找出性能退化
+
+    python -m methods.benchmark --sizes 1000,100000 --output bench.json
+    python -m methods.benchmark --output bench.json --baseline baseline.json --threshold 0.2
+    python -m methods.benchmark --output baseline.json --filter dt.
+
+基线需要在同一台机器上由 --output 生成，不同机器之间的结果没有可比性
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from typing import Callable
+
+from methods import dt, files
+
+SIZES = (1000, 10000, 100000)
+REPEAT = 5
+# 最小耗时或峰值内存超过基线的比例
+THRESHOLD = 0.2
+
+_BASE_DATE = datetime(2000, 1, 1)
+
+
+class Case:
+    """
+    单个基准测试
+
+    :param setup: setup(size, workdir) 生成测试数据，返回传给 func 的参数
+    :param func: 被测函数，func(data)
+    :param requires: 依赖的可选模块，未安装时跳过
+    """
+
+    def __init__(self, name: str, setup: Callable, func: Callable, requires=()) -> None:
+        self.name = name
+        self.setup = setup
+        self.func = func
+        self.requires = requires
+
+    def available(self) -> bool:
+        for module in self.requires:
+            try:
+                __import__(module)
+            except ImportError:
+                return False
+        return True
+
+
+def make_rows(size: int, columns=5, seed=0) -> list:
+    rng = random.Random(seed)
+    return [
+        [str(index)] + [f'{rng.random():.6f}' for _ in range(columns - 2)] + [f'name{rng.randrange(1000)}']
+        for index in range(size)
+    ]
+
+
+def make_dates(size: int) -> list:
+    return [_BASE_DATE + timedelta(days=index % 36500, seconds=index % 86400) for index in range(size)]
+
+
+def _csv_file(size: int, workdir: str) -> str:
+    filename = os.path.join(workdir, f'bench_{size}.csv')
+    if not os.path.exists(filename):
+        files.save_csv(make_rows(size), filename, headers=['id', 'a', 'b', 'c', 'name'])
+    return filename
+
+
+def _txt_file(size: int, workdir: str) -> str:
+    filename = os.path.join(workdir, f'bench_{size}.txt')
+    if not os.path.exists(filename):
+        files.save_txt([','.join(row) for row in make_rows(size)], filename)
+    return filename
+
+
+def _json_file(size: int, workdir: str) -> str:
+    filename = os.path.join(workdir, f'bench_{size}.json')
+    if not os.path.exists(filename):
+        files.save_json({f'key{index}': row for index, row in enumerate(make_rows(size))}, filename, indent=None)
+    return filename
+
+
+def _consume(iterator) -> int:
+    count = 0
+    for _ in iterator:
+        count += 1
+    return count
+
+
+def _pd_cached_setup(size: int, workdir: str) -> tuple:
+    filename = _csv_file(size, workdir)
+    cache_dir = os.path.join(workdir, 'parse_cache')
+    # 预先生成缓存，只测量命中缓存时的读取
+    files.pd_read_csv(filename, cache=True, cache_dir=cache_dir)
+    return filename, cache_dir
+
+
+def _weekday_setup(size: int, workdir: str) -> tuple:
+    # 每 7 天一个结果，返回约 size 个日期
+    return _BASE_DATE, _BASE_DATE + timedelta(days=size * 7)
+
+
+def default_cases() -> list:
+    return [
+        Case('files.read_csv', _csv_file, files.read_csv),
+        Case('files.iter_csv', _csv_file, lambda filename: _consume(files.iter_csv(filename))),
+        Case('files.pd_read_csv', _csv_file, files.pd_read_csv, requires=('pandas',)),
+        Case(
+            'files.pd_read_csv[cache]', _pd_cached_setup,
+            lambda args: files.pd_read_csv(args[0], cache=True, cache_dir=args[1]), requires=('pandas',),
+        ),
+        Case('files.read_txt', _txt_file, files.read_txt),
+        Case('files.iter_txt', _txt_file, lambda filename: _consume(files.iter_txt(filename))),
+        Case('files.read_json', _json_file, files.read_json),
+        Case(
+            'files.save_csv', lambda size, workdir: (make_rows(size), os.path.join(workdir, 'save.csv')),
+            lambda args: files.save_csv(args[0], args[1]),
+        ),
+        Case(
+            'files.save_csv[atomic]', lambda size, workdir: (make_rows(size), os.path.join(workdir, 'save.csv')),
+            lambda args: files.save_csv(args[0], args[1], atomic=True),
+        ),
+        Case(
+            'files.save_csv[gzip]', lambda size, workdir: (make_rows(size), os.path.join(workdir, 'save.csv.gz')),
+            lambda args: files.save_csv(args[0], args[1]),
+        ),
+        Case(
+            'files.save_txt',
+            lambda size, workdir: ([','.join(row) for row in make_rows(size)], os.path.join(workdir, 'save.txt')),
+            lambda args: files.save_txt(args[0], args[1]),
+        ),
+        Case(
+            'files.save_json',
+            lambda size, workdir: (
+                {f'key{index}': row for index, row in enumerate(make_rows(size))}, os.path.join(workdir, 'save.json')
+            ),
+            lambda args: files.save_json(args[0], args[1], indent=None),
+        ),
+        Case(
+            'dt.weekday_in_interval', _weekday_setup,
+            lambda args: dt.weekday_in_interval(1, args[0], args[1]),
+        ),
+        Case(
+            'dt.iter_weekday_in_interval', _weekday_setup,
+            lambda args: _consume(dt.iter_weekday_in_interval(1, args[0], args[1], case_func=datetime)),
+        ),
+        Case(
+            'dt.np_weekday_in_interval', _weekday_setup,
+            lambda args: dt.np_weekday_in_interval(1, args[0], args[1]), requires=('numpy',),
+        ),
+        Case(
+            'dt.date2int', lambda size, workdir: make_dates(size),
+            lambda dates: [dt.date2int(item) for item in dates],
+        ),
+        Case(
+            'dt.np_date2int', lambda size, workdir: dt.to_datetime64(make_dates(size)), dt.np_date2int,
+            requires=('numpy',),
+        ),
+        Case(
+            'dt.day_in_year', lambda size, workdir: make_dates(size),
+            lambda dates: [dt.day_in_year(item) for item in dates],
+        ),
+        Case(
+            'dt.np_day_in_year', lambda size, workdir: dt.to_datetime64(make_dates(size)), dt.np_day_in_year,
+            requires=('numpy',),
+        ),
+    ]
+
+
+def _percentile(samples: list, p: float) -> float:
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, max(0, round(p / 100 * (len(samples) - 1))))]
+
+
+def measure(func: Callable, data, size: int, repeat=REPEAT, warmup=1) -> dict:
+    """
+    测量延迟及吞吐量，峰值内存单独运行一次测量，避免 tracemalloc 影响计时
+    """
+    for _ in range(warmup):
+        func(data)
+    samples = []
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter_ns()
+            func(data)
+            samples.append((time.perf_counter_ns() - start) / 1e6)
+    finally:
+        if gc_enabled:
+            gc.enable()
+    tracemalloc.start()
+    try:
+        func(data)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    median = _percentile(samples, 50)
+    return {
+        'size': size,
+        'repeat': repeat,
+        'min_ms': min(samples),
+        'median_ms': median,
+        'p90_ms': _percentile(samples, 90),
+        'mean_ms': sum(samples) / len(samples),
+        'throughput': size / (median / 1000) if median else None,
+        'peak_bytes': peak,
+    }
+
+
+def run(sizes=SIZES, repeat=REPEAT, name_filter: str = None, cases: list = None, workdir: str = None) -> dict:
+    """
+    运行基准测试
+    :param name_filter: 只运行名称包含该字符串的测试
+    :return:
+        {'meta': 运行环境, 'results': 每个 (测试, 规模) 一条结果}
+    """
+    cases = default_cases() if cases is None else cases
+    results = []
+    with tempfile.TemporaryDirectory(prefix='methods-bench-') as tmpdir:
+        workdir = workdir or tmpdir
+        for case in cases:
+            if name_filter and name_filter not in case.name:
+                continue
+            if not case.available():
+                results.append({'name': case.name, 'skipped': f'requires {",".join(case.requires)}'})
+                continue
+            for size in sizes:
+                data = case.setup(size, workdir)
+                item = {'name': case.name}
+                item.update(measure(case.func, data, size, repeat=repeat))
+                results.append(item)
+                print(
+                    f'{case.name:<32} size={size:<8} median={item["median_ms"]:>10.3f}ms '
+                    f'throughput={item["throughput"] or 0:>14,.0f}/s peak={item["peak_bytes"] / 1024:>10,.0f}KB',
+                    file=sys.stderr,
+                )
+    return {'meta': environment(), 'results': results}
+
+
+def environment() -> dict:
+    meta = {
+        'time': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+    }
+    for module in ('numpy', 'pandas', 'pyarrow'):
+        try:
+            meta[module] = __import__(module).__version__
+        except ImportError:
+            meta[module] = None
+    return meta
+
+
+def compare(current: dict, baseline: dict, threshold=THRESHOLD, metrics=('min_ms', 'peak_bytes')) -> list:
+    """
+    与基线比较，按 (name, size) 匹配
+
+    耗时默认比较最小值，受系统调度等噪声的影响最小
+
+    :return:
+        每个指标的比较结果，status 为 regression（超过基线 threshold 比例）、improved、ok
+    """
+    base = {
+        (item['name'], item['size']): item for item in baseline.get('results', []) if 'skipped' not in item
+    }
+    rows = []
+    for item in current.get('results', []):
+        if 'skipped' in item:
+            continue
+        old = base.get((item['name'], item['size']))
+        if old is None:
+            continue
+        for metric in metrics:
+            if not old.get(metric) or item.get(metric) is None:
+                continue
+            ratio = item[metric] / old[metric]
+            if ratio > 1 + threshold:
+                status = 'regression'
+            elif ratio < 1 / (1 + threshold):
+                status = 'improved'
+            else:
+                status = 'ok'
+            rows.append({
+                'name': item['name'], 'size': item['size'], 'metric': metric,
+                'baseline': old[metric], 'current': item[metric], 'ratio': round(ratio, 3), 'status': status,
+            })
+    return rows
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog='python -m methods.benchmark', description='methods.files / methods.dt 基准测试',
+    )
+    parser.add_argument('--sizes', default=','.join(map(str, SIZES)), help='数据规模，逗号分隔')
+    parser.add_argument('--repeat', type=int, default=REPEAT, help='每个规模的重复次数')
+    parser.add_argument('--filter', dest='name_filter', help='只运行名称包含该字符串的测试')
+    parser.add_argument('--output', help='结果保存路径（json）')
+    parser.add_argument('--baseline', help='用于比较的基线结果（json）')
+    parser.add_argument('--threshold', type=float, default=THRESHOLD, help='判定退化的比例')
+    args = parser.parse_args(argv)
+
+    result = run(sizes=[int(size) for size in args.sizes.split(',')], repeat=args.repeat, name_filter=args.name_filter)
+    if args.output:
+        files.save_json(result, args.output, atomic=True)
+    else:
+        print(json.dumps(result, indent=2))
+    if not args.baseline:
+        return 0
+    rows = compare(result, files.read_json(args.baseline), threshold=args.threshold)
+    regressions = [row for row in rows if row['status'] == 'regression']
+    for row in rows:
+        print(
+            f'{row["status"]:<10} {row["name"]:<32} size={row["size"]:<8} {row["metric"]:<10} '
+            f'{row["baseline"]:.3f} -> {row["current"]:.3f} ({row["ratio"]:.2f}x)',
+            file=sys.stderr,
+        )
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+"""
+大对象分块存储
+
+大于几 MB 的值拆分为多个分块 key，由一个清单（hash）记录大小、分块数量和版本，
+分块以管道批量、多个管道并发的方式读写，避免单个大命令长时间阻塞 redis
+
+    store = BlobStore(redis_client)
+    await store.put('report', data)             # bytes / bytearray / memoryview
+    data = await store.get('report')             # bytearray
+    await store.read_into('report', buffer)      # 读入已分配的缓冲区
+    await store.download('report', 'report.bin') # 流式写入文件
+
+写入时先写分块，最后写清单，读取方在清单更新前始终读到完整的旧版本
+"""
+import asyncio
+import uuid
+from collections import deque
+from typing import AsyncIterator, Optional
+
+from methods.afiles import run_io
+from methods.exceptions import MethodException
+from methods.files import open_file
+from methods.redis import RedisClient
+
+# 每个分块的大小
+CHUNK_SIZE = 1024 * 1024
+# 每个管道包含的分块数量
+CHUNKS_PER_PIPELINE = 4
+# 同时执行的管道数量
+CONCURRENCY = 4
+
+
+def _decode(value) -> str:
+    return value.decode('utf-8') if isinstance(value, bytes) else value
+
+
+class BlobStore:
+    """
+    分块存储大对象
+
+    清单 key 为 {prefix}{name}，分块 key 为 {prefix}{name}:{version}:{index}
+    """
+
+    def __init__(
+            self, redis_client: RedisClient, prefix='blob:', chunk_size=CHUNK_SIZE,
+            chunks_per_pipeline=CHUNKS_PER_PIPELINE, concurrency=CONCURRENCY,
+    ) -> None:
+        self.redis_client = redis_client
+        self.prefix = prefix
+        self.chunk_size = chunk_size
+        self.chunks_per_pipeline = chunks_per_pipeline
+        self.concurrency = concurrency
+
+    def manifest_key(self, name: str) -> str:
+        return f'{self.prefix}{name}'
+
+    def chunk_key(self, name: str, version: str, index: int) -> str:
+        return f'{self.prefix}{name}:{version}:{index}'
+
+    async def info(self, name: str) -> Optional[dict]:
+        """
+        读取清单: size, chunk_size, chunks, version，不存在时返回 None
+        """
+        mapping = await self.redis_client.hgetall(self.manifest_key(name))
+        if not mapping:
+            return None
+        mapping = {_decode(key): _decode(value) for key, value in mapping.items()}
+        return {
+            'size': int(mapping['size']),
+            'chunk_size': int(mapping['chunk_size']),
+            'chunks': int(mapping['chunks']),
+            'version': mapping['version'],
+        }
+
+    async def _write_chunks(self, name: str, version: str, chunks: AsyncIterator[bytes], ttl: int = None) -> tuple:
+        semaphore = asyncio.Semaphore(self.concurrency)
+        pending = set()
+        failures = []
+
+        def on_done(task: asyncio.Future) -> None:
+            pending.discard(task)
+            if not task.cancelled() and task.exception() is not None:
+                failures.append(task.exception())
+
+        async def flush(start: int, group: list) -> None:
+            try:
+                async with await self.redis_client.pipeline() as pipe:
+                    for index, chunk in enumerate(group, start):
+                        if ttl:
+                            await pipe.setex(self.chunk_key(name, version, index), ttl, chunk)
+                        else:
+                            await pipe.set(self.chunk_key(name, version, index), chunk)
+                    await pipe.execute()
+            finally:
+                semaphore.release()
+
+        async def submit(start: int, group: list) -> None:
+            await semaphore.acquire()
+            if failures:
+                # 已有分块写入失败时不再提交
+                semaphore.release()
+                raise failures[0]
+            task = asyncio.ensure_future(flush(start, group))
+            pending.add(task)
+            task.add_done_callback(on_done)
+
+        count = size = 0
+        group = []
+        try:
+            async for chunk in chunks:
+                group.append(chunk)
+                size += len(chunk)
+                if len(group) >= self.chunks_per_pipeline:
+                    await submit(count, group)
+                    count += len(group)
+                    group = []
+            if group:
+                await submit(count, group)
+                count += len(group)
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+            if failures:
+                raise failures[0]
+        except BaseException:
+            for task in pending:
+                task.cancel()
+            # 等待取消完成后再删除，避免删除后仍有分块写入
+            await asyncio.gather(*pending, return_exceptions=True)
+            await self._delete_chunks(name, version, count)
+            raise
+        return count, size
+
+    async def _commit(self, name: str, version: str, chunks: int, size: int, ttl: int = None) -> dict:
+        old = await self.info(name)
+        manifest = {'size': size, 'chunk_size': self.chunk_size, 'chunks': chunks, 'version': version}
+        # 清单的字段固定，直接覆盖，不先删除，读取方不会读到清单不存在的中间状态
+        async with await self.redis_client.pipeline() as pipe:
+            await pipe.hmset(self.manifest_key(name), manifest)
+            if ttl:
+                await pipe.expire(self.manifest_key(name), ttl)
+            else:
+                await pipe.persist(self.manifest_key(name))
+            await pipe.execute()
+        if old:
+            await self._delete_chunks(name, old['version'], old['chunks'])
+        return manifest
+
+    async def _delete_chunks(self, name: str, version: str, chunks: int) -> None:
+        for start in range(0, chunks, 1000):
+            async with await self.redis_client.pipeline() as pipe:
+                for index in range(start, min(start + 1000, chunks)):
+                    await pipe.delete(self.chunk_key(name, version, index))
+                await pipe.execute()
+
+    async def put(self, name: str, data, ttl: int = None) -> dict:
+        """
+        写入 bytes、bytearray、memoryview 等支持缓冲区协议的对象
+
+        aredis 会将 bytes 以外的类型转换为字符串，因此每个分块需要从 memoryview 切片复制一次为 bytes，
+        整个对象不会产生额外的完整副本
+        :return:
+            清单
+        """
+        view = memoryview(data).cast('B')
+
+        async def iter_chunks():
+            for offset in range(0, len(view), self.chunk_size):
+                yield bytes(view[offset:offset + self.chunk_size])
+
+        version = uuid.uuid4().hex
+        chunks, size = await self._write_chunks(name, version, iter_chunks(), ttl)
+        return await self._commit(name, version, chunks, size, ttl)
+
+    async def upload(self, name: str, filename: str, ttl: int = None, compression='infer') -> dict:
+        """
+        从文件流式写入，内存占用与文件大小无关
+        """
+        fr = await run_io(open_file, filename, 'rb', compression=compression)
+
+        async def iter_chunks():
+            while True:
+                chunk = await run_io(fr.read, self.chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+        try:
+            version = uuid.uuid4().hex
+            chunks, size = await self._write_chunks(name, version, iter_chunks(), ttl)
+        finally:
+            await run_io(fr.close)
+        return await self._commit(name, version, chunks, size, ttl)
+
+    async def _read_group(self, name: str, manifest: dict, start: int) -> list:
+        end = min(start + self.chunks_per_pipeline, manifest['chunks'])
+        async with await self.redis_client.pipeline() as pipe:
+            for index in range(start, end):
+                await pipe.get(self.chunk_key(name, manifest['version'], index))
+            chunks = await pipe.execute()
+        if any(chunk is None for chunk in chunks):
+            raise MethodException(f'分块缺失，对象可能已被更新或过期: {name}')
+        return chunks
+
+    async def iter_chunks(self, name: str) -> AsyncIterator[bytes]:
+        """
+        按顺序返回分块，同时预读后续 concurrency 个管道
+        """
+        manifest = await self.info(name)
+        if manifest is None:
+            raise MethodException(f'对象不存在: {name}')
+        starts = iter(range(0, manifest['chunks'], self.chunks_per_pipeline))
+        tasks = deque()
+        try:
+            for start in starts:
+                tasks.append(asyncio.ensure_future(self._read_group(name, manifest, start)))
+                if len(tasks) >= self.concurrency:
+                    break
+            while tasks:
+                chunks = await tasks.popleft()
+                start = next(starts, None)
+                if start is not None:
+                    tasks.append(asyncio.ensure_future(self._read_group(name, manifest, start)))
+                for chunk in chunks:
+                    yield chunk
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def read_into(self, name: str, buffer) -> int:
+        """
+        读入可写缓冲区（bytearray、memoryview、numpy 数组等），分块直接复制到对应位置
+        :return:
+            写入的字节数
+        """
+        manifest = await self.info(name)
+        if manifest is None:
+            raise MethodException(f'对象不存在: {name}')
+        return await self._read_into(name, manifest, buffer)
+
+    async def _read_into(self, name: str, manifest: dict, buffer) -> int:
+        view = memoryview(buffer).cast('B')
+        if len(view) < manifest['size']:
+            raise MethodException(f'缓冲区大小不足: {len(view)} < {manifest["size"]}')
+        chunk_size = manifest['chunk_size']
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def read(start: int) -> None:
+            async with semaphore:
+                chunks = await self._read_group(name, manifest, start)
+            for index, chunk in enumerate(chunks, start):
+                offset = index * chunk_size
+                view[offset:offset + len(chunk)] = chunk
+
+        await asyncio.gather(*[read(start) for start in range(0, manifest['chunks'], self.chunks_per_pipeline)])
+        return manifest['size']
+
+    async def get(self, name: str) -> Optional[bytearray]:
+        """
+        读取整个对象，不存在时返回 None
+        """
+        manifest = await self.info(name)
+        if manifest is None:
+            return None
+        # 使用同一份清单分配和读取，避免两次读取清单之间对象被更新
+        buffer = bytearray(manifest['size'])
+        await self._read_into(name, manifest, buffer)
+        return buffer
+
+    async def download(self, name: str, filename: str, atomic=True, compression='infer') -> int:
+        """
+        流式写入文件，内存中最多保留 concurrency 个管道的分块
+        :return:
+            写入的字节数
+        """
+        fw = await run_io(open_file, filename, 'wb', compression=compression, atomic=atomic)
+        size = 0
+        try:
+            async for chunk in self.iter_chunks(name):
+                await run_io(fw.write, chunk)
+                size += len(chunk)
+        except BaseException:
+            await run_io(fw.discard if hasattr(fw, 'discard') else fw.close)
+            raise
+        await run_io(fw.close)
+        return size
+
+    async def delete(self, name: str) -> bool:
+        manifest = await self.info(name)
+        if manifest is None:
+            return False
+        await self.redis_client.delete(self.manifest_key(name))
+        await self._delete_chunks(name, manifest['version'], manifest['chunks'])
+        return True
@@ -0,0 +1,323 @@
+# -*- coding: utf-8 -*-
+"""
+文件与 Redis 之间的批量数据迁移
+
+load_to_redis: 将 csv/jsonl 文件中的行以管道批量写入 hash、zset、stream
+export_from_redis: 通过 SCAN 遍历 key，以恒定内存导出为 csv/jsonl
+"""
+import asyncio
+import csv
+import json
+import os
+import time
+from typing import AsyncIterator, Callable, Optional
+
+from methods.afiles import CHUNK_SIZE, aiter_csv, aiter_txt, run_io
+from methods.exceptions import MethodException
+from methods.files import detect_compression, open_file
+from methods.logger import logger
+from methods.redis import RedisClient
+
+
+class Progress:
+    """
+    迁移进度统计
+
+    每隔 interval 秒调用一次 callback(progress)，默认输出日志
+    """
+
+    def __init__(self, name: str, callback: Callable = None, interval=5.0) -> None:
+        self.name = name
+        self.callback = callback or self._log
+        self.interval = interval
+        self.count = 0
+        self.started = time.monotonic()
+        self._last_report = self.started
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    @property
+    def rate(self) -> float:
+        """
+        每秒处理的行数
+        """
+        elapsed = self.elapsed
+        return self.count / elapsed if elapsed > 0 else 0.0
+
+    def update(self, count: int) -> None:
+        self.count += count
+        if time.monotonic() - self._last_report >= self.interval:
+            self.report()
+
+    def report(self) -> None:
+        self._last_report = time.monotonic()
+        self.callback(self)
+
+    def to_dict(self) -> dict:
+        return {'name': self.name, 'count': self.count, 'elapsed': round(self.elapsed, 3), 'rate': round(self.rate, 1)}
+
+    @staticmethod
+    def _log(progress) -> None:
+        logger.info(
+            'task=%s\tcount=%d\telapsed=%.1fs\trate=%.0f/s',
+            progress.name, progress.count, progress.elapsed, progress.rate,
+        )
+
+
+def _file_format(filename: str, file_format: str = None) -> str:
+    if file_format:
+        return file_format
+    name = filename
+    if detect_compression(filename, 'w'):
+        name = os.path.splitext(filename)[0]
+    ext = os.path.splitext(name)[1].lower()
+    if ext == '.csv':
+        return 'csv'
+    if ext in ('.jsonl', '.json', '.ndjson'):
+        return 'jsonl'
+    raise MethodException(f'无法识别的文件格式: {filename}')
+
+
+async def aiter_rows(filename: str, file_format: str = None, chunk_size=CHUNK_SIZE) -> AsyncIterator[dict]:
+    """
+    逐行读取 csv（首行为表头）或 jsonl 文件，每行返回一个字典
+    """
+    if _file_format(filename, file_format) == 'csv':
+        headers = None
+        async for row in aiter_csv(filename, chunk_size=chunk_size):
+            if headers is None:
+                headers = row
+                continue
+            yield dict(zip(headers, row))
+    else:
+        async for line in aiter_txt(filename, chunk_size=chunk_size):
+            yield json.loads(line)
+
+
+async def _queue_row(pipe, row: dict, kind: str, key: str, key_field, member_field, score_field, max_len, ttl):
+    if kind == 'hash':
+        name = f'{key}{row[key_field]}' if key_field else key
+        await pipe.hmset(name, row)
+    elif kind == 'zset':
+        name = f'{key}{row[key_field]}' if key_field else key
+        await pipe.zadd(name, float(row[score_field]), row[member_field])
+    elif kind == 'stream':
+        name = f'{key}{row[key_field]}' if key_field else key
+        await pipe.xadd(name, row, max_len=max_len)
+    else:
+        raise MethodException(f'不支持的类型: {kind}')
+    if ttl:
+        await pipe.expire(name, ttl)
+
+
+async def load_to_redis(
+        redis_client: RedisClient, filename: str, kind='hash', key='', key_field=None,
+        member_field=None, score_field=None, max_len=None, ttl=None,
+        batch_size=1000, concurrency=4, file_format=None, progress: Optional[Progress] = None,
+) -> Progress:
+    """
+    将 csv/jsonl 文件批量写入 redis
+
+    :param kind:
+        hash: 每行写入一个哈希表，名称为 key + row[key_field]
+        zset: 每行以 row[score_field] 为分数、row[member_field] 为成员写入有序集合 key（或 key + row[key_field]）
+        stream: 每行作为一条消息写入 stream key（或 key + row[key_field]）
+    :param max_len: stream 的最大长度
+    :param ttl: 写入后为 key 设置的过期时间（秒）
+    :param batch_size: 每个管道包含的行数
+    :param concurrency: 同时执行的管道数量
+    :return:
+        迁移进度统计
+    某个批次写入失败时不再提交新的批次，等待已提交的批次执行完后抛出该异常，
+    此时传入的 progress.count 为成功写入的行数
+    """
+    if kind == 'hash' and not key_field:
+        raise MethodException('hash 类型需要指定 key_field')
+    if kind == 'zset' and not (member_field and score_field):
+        raise MethodException('zset 类型需要指定 member_field 和 score_field')
+    progress = progress or Progress(f'load:{filename}')
+    semaphore = asyncio.Semaphore(concurrency)
+    pending = set()
+    failures = []
+
+    def on_done(task: asyncio.Future) -> None:
+        pending.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            failures.append(task.exception())
+
+    async def flush(rows: list) -> None:
+        try:
+            async with await redis_client.pipeline() as pipe:
+                for row in rows:
+                    await _queue_row(pipe, row, kind, key, key_field, member_field, score_field, max_len, ttl)
+                await pipe.execute()
+            progress.update(len(rows))
+        finally:
+            semaphore.release()
+
+    async def submit(rows: list) -> None:
+        await semaphore.acquire()
+        if failures:
+            # 已有批次写入失败时不再提交
+            semaphore.release()
+            raise failures[0]
+        task = asyncio.ensure_future(flush(rows))
+        pending.add(task)
+        task.add_done_callback(on_done)
+
+    try:
+        rows = []
+        async for row in aiter_rows(filename, file_format):
+            rows.append(row)
+            if len(rows) >= batch_size:
+                await submit(rows)
+                rows = []
+        if rows:
+            await submit(rows)
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+        if failures:
+            raise failures[0]
+    except Exception:
+        await asyncio.gather(*pending, return_exceptions=True)
+        raise
+    finally:
+        # 只有被取消时才会有未完成的批次
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+    progress.report()
+    return progress
+
+
+def _decode(value):
+    if isinstance(value, bytes):
+        return value.decode('utf-8', errors='replace')
+    return value
+
+
+def _next_stream_id(stream_id: str) -> str:
+    ms, seq = stream_id.split('-')
+    return f'{ms}-{int(seq) + 1}'
+
+
+async def _iter_key_records(redis_client: RedisClient, key: str, kind: str, count: int) -> AsyncIterator[tuple]:
+    """
+    分批读取单个 key 的内容，每个元素返回 (field, value)
+    """
+    if kind == 'string':
+        yield '', await redis_client.get(key)
+    elif kind == 'hash':
+        cursor = 0
+        while True:
+            cursor, mapping = await redis_client.hscan(key, cursor=cursor, count=count)
+            for field, value in mapping.items():
+                yield field, value
+            if not cursor:
+                break
+    elif kind == 'zset':
+        cursor = 0
+        while True:
+            cursor, items = await redis_client.zscan(key, cursor=cursor, count=count)
+            for member, score in items:
+                yield member, score
+            if not cursor:
+                break
+    elif kind == 'set':
+        cursor = 0
+        while True:
+            cursor, members = await redis_client.sscan(key, cursor=cursor, count=count)
+            for member in members:
+                yield member, ''
+            if not cursor:
+                break
+    elif kind == 'list':
+        start = 0
+        while True:
+            values = await redis_client.lrange(key, start, start + count - 1)
+            for index, value in enumerate(values, start):
+                yield index, value
+            if len(values) < count:
+                break
+            start += count
+    elif kind == 'stream':
+        start = '-'
+        while True:
+            records = await redis_client.xrange(key, start=start, count=count)
+            for stream_id, fields in records:
+                stream_id = _decode(stream_id)
+                yield stream_id, json.dumps({_decode(k): _decode(v) for k, v in fields.items()}, ensure_ascii=False)
+            if len(records) < count:
+                break
+            start = _next_stream_id(stream_id)
+
+
+def _write_records(fw, records: list, file_format: str) -> None:
+    if file_format == 'csv':
+        csv.writer(fw).writerows(records)
+    else:
+        fw.write(''.join(
+            json.dumps(dict(zip(('key', 'type', 'field', 'value'), record)), ensure_ascii=False) + '\n'
+            for record in records
+        ))
+
+
+async def export_from_redis(
+        redis_client: RedisClient, filename: str, match='*', kind: str = None,
+        count=1000, batch_size=CHUNK_SIZE, file_format=None, atomic=True, progress: Optional[Progress] = None,
+) -> Progress:
+    """
+    通过 SCAN 遍历匹配 match 的 key，导出到 csv/jsonl 文件
+
+    每个元素输出一行: key, type, field, value
+        string: field 为空
+        hash: 字段及值
+        zset: 成员及分数
+        set: 成员，value 为空
+        list: 下标及值
+        stream: 消息 id 及 json 格式的消息内容
+    单个 key 的内容同样分批读取，内存占用与数据总量无关
+    :param kind: 只导出指定类型的 key
+    :param count: SCAN 及 HSCAN 等命令每次返回的数量提示
+    :param batch_size: 每次写入文件的行数
+    :return:
+        迁移进度统计，count 为导出的行数
+    """
+    file_format = _file_format(filename, file_format)
+    progress = progress or Progress(f'export:{filename}')
+    fw = await run_io(open_file, filename, 'w', newline='' if file_format == 'csv' else None, atomic=atomic)
+    try:
+        if file_format == 'csv':
+            await run_io(_write_records, fw, [('key', 'type', 'field', 'value')], file_format)
+        records = []
+        cursor = 0
+        while True:
+            cursor, keys = await redis_client.scan(cursor=cursor, match=match, count=count)
+            if keys:
+                async with await redis_client.pipeline() as pipe:
+                    for key in keys:
+                        await pipe.type(key)
+                    types = await pipe.execute()
+                for key, key_type in zip(keys, types):
+                    key_type = _decode(key_type)
+                    if kind and key_type != kind:
+                        continue
+                    async for field, value in _iter_key_records(redis_client, key, key_type, count):
+                        records.append((_decode(key), key_type, _decode(field), _decode(value)))
+                        if len(records) >= batch_size:
+                            await run_io(_write_records, fw, records, file_format)
+                            progress.update(len(records))
+                            records = []
+            if not cursor:
+                break
+        if records:
+            await run_io(_write_records, fw, records, file_format)
+            progress.update(len(records))
+    except BaseException:
+        await run_io(fw.discard if hasattr(fw, 'discard') else fw.close)
+        raise
+    await run_io(fw.close)
+    progress.report()
+    return progress
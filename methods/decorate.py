@@ -1,24 +1,412 @@
 # -*- coding: utf-8 -*-
+import hashlib
+import inspect
+import json
+import pickle
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
 from functools import wraps
 
-from methods.dt import now
+from methods.exceptions import MethodException
 from methods.logger import logger
 
+# 是否开启耗时统计，关闭后被装饰函数只多一次布尔判断
+PROFILE_ENABLED = True
+# 每个函数保留用于计算分位数的最近耗时样本数量
+PROFILE_SAMPLES = 1024
+# 自动输出汇总日志的间隔（秒），None 表示不自动输出
+SUMMARY_INTERVAL = None
+
+
+class ProfileStats:
+    """
+    单个函数的耗时统计，单位：纳秒
+    """
+    __slots__ = ('name', 'count', 'total_ns', 'min_ns', 'max_ns', 'errors', 'samples')
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.count = 0
+        self.total_ns = 0
+        self.min_ns = None
+        self.max_ns = 0
+        self.errors = 0
+        self.samples = deque(maxlen=PROFILE_SAMPLES)
+
+    def add(self, elapsed_ns: int, error=False) -> None:
+        self.count += 1
+        self.total_ns += elapsed_ns
+        if self.min_ns is None or elapsed_ns < self.min_ns:
+            self.min_ns = elapsed_ns
+        if elapsed_ns > self.max_ns:
+            self.max_ns = elapsed_ns
+        if error:
+            self.errors += 1
+        self.samples.append(elapsed_ns)
+
+    def percentile(self, p: float) -> int:
+        """
+        最近样本中的第 p 百分位耗时
+        """
+        if not self.samples:
+            return 0
+        samples = sorted(self.samples)
+        index = min(len(samples) - 1, max(0, round(p / 100 * (len(samples) - 1))))
+        return samples[index]
+
+    def to_dict(self) -> dict:
+        """
+        汇总结果，耗时单位：毫秒
+        """
+        return {
+            'function': self.name,
+            'count': self.count,
+            'errors': self.errors,
+            'total_ms': self.total_ns / 1e6,
+            'avg_ms': self.total_ns / self.count / 1e6 if self.count else 0.0,
+            'min_ms': (self.min_ns or 0) / 1e6,
+            'max_ms': self.max_ns / 1e6,
+            'p50_ms': self.percentile(50) / 1e6,
+            'p90_ms': self.percentile(90) / 1e6,
+            'p99_ms': self.percentile(99) / 1e6,
+        }
+
+
+_stats = {}
+_lock = threading.Lock()
+_last_summary = time.monotonic()
+
+
+def _record(name: str, elapsed_ns: int, error: bool) -> None:
+    global _last_summary
+    with _lock:
+        stats = _stats.get(name)
+        if stats is None:
+            stats = _stats[name] = ProfileStats(name)
+        stats.add(elapsed_ns, error)
+        if SUMMARY_INTERVAL is None or time.monotonic() - _last_summary < SUMMARY_INTERVAL:
+            return
+        _last_summary = time.monotonic()
+    log_stats()
+
+
+def profile(f=None, name: str = None):
+    """
+    耗时统计装饰器，支持普通函数及协程函数
+
+    使用单调时钟计时，结果累计在内存中（次数、总耗时、最小/最大耗时、分位数），
+    通过 get_stats、dump_stats、log_stats 查看，或设置 SUMMARY_INTERVAL 定期输出日志
+
+        @profile
+        def func(): ...
+
+        @profile(name='redis.get')
+        async def get(): ...
+    """
+    if f is None:
+        return lambda func: profile(func, name=name)
+    func_name = name or f.__qualname__
+
+    if inspect.iscoroutinefunction(f):
+        @wraps(f)
+        async def async_func(*args, **kwargs):
+            if not PROFILE_ENABLED:
+                return await f(*args, **kwargs)
+            start = time.perf_counter_ns()
+            error = True
+            try:
+                res = await f(*args, **kwargs)
+                error = False
+                return res
+            finally:
+                _record(func_name, time.perf_counter_ns() - start, error)
+        return async_func
 
-def decorate(f):
     @wraps(f)
     def func(*args, **kwargs):
-        func_name = f.__name__
-        logger.info(f"function={func_name}\tstart_time={now()}")
-        res = f(*args, **kwargs)
-        logger.info(f"function={func_name}\tend_time={now()}")
-        return res
+        if not PROFILE_ENABLED:
+            return f(*args, **kwargs)
+        start = time.perf_counter_ns()
+        error = True
+        try:
+            res = f(*args, **kwargs)
+            error = False
+            return res
+        finally:
+            _record(func_name, time.perf_counter_ns() - start, error)
     return func
 
 
+# 兼容旧名称
+decorate = profile
+
+
+def enable_profile() -> None:
+    global PROFILE_ENABLED
+    PROFILE_ENABLED = True
+
+
+def disable_profile() -> None:
+    global PROFILE_ENABLED
+    PROFILE_ENABLED = False
+
+
+def get_stats(name: str = None):
+    """
+    获取耗时统计
+
+    :return:
+        指定 name 时返回该函数的统计字典（不存在时为 None），否则返回所有函数的统计列表，按总耗时倒序
+    """
+    with _lock:
+        if name is not None:
+            stats = _stats.get(name)
+            return stats.to_dict() if stats else None
+        items = [stats.to_dict() for stats in _stats.values()]
+    return sorted(items, key=lambda item: item['total_ms'], reverse=True)
+
+
+def reset_stats() -> None:
+    with _lock:
+        _stats.clear()
+
+
+def log_stats() -> None:
+    """
+    输出所有函数的耗时汇总日志
+    """
+    for item in get_stats():
+        logger.info(
+            'function=%s\tcount=%d\terrors=%d\tavg=%.3fms\tp50=%.3fms\tp99=%.3fms\tmax=%.3fms',
+            item['function'], item['count'], item['errors'],
+            item['avg_ms'], item['p50_ms'], item['p99_ms'], item['max_ms'],
+        )
+
+
+def dump_stats(filename: str = None, reset=False) -> list:
+    """
+    导出耗时统计，指定 filename 时保存为 json 文件
+    """
+    items = get_stats()
+    if filename:
+        from methods.files import save_json
+        save_json(items, filename)
+    if reset:
+        reset_stats()
+    return items
+
+
+class JsonCodec:
+    """
+    缓存值的 json 编解码
+    """
+
+    @staticmethod
+    def dumps(value) -> bytes:
+        return json.dumps(value, ensure_ascii=False).encode('utf-8')
+
+    @staticmethod
+    def loads(data: bytes):
+        return json.loads(data)
+
+
+class PickleCodec:
+    """
+    缓存值的 pickle 编解码，支持任意对象，只能用于可信的 redis
+    """
+
+    @staticmethod
+    def dumps(value) -> bytes:
+        return pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def loads(data: bytes):
+        return pickle.loads(data)
+
+
+_MISSING = object()
+
+
+class LRUCache:
+    """
+    线程安全的 LRU 缓存
+
+    :param maxsize: 最多缓存的条数
+    :param ttl: 过期时间（秒），None 表示不过期
+    :param max_bytes: 缓存值占用的总大小上限，由 sizeof 估算，None 表示不限制
+    """
+
+    def __init__(self, maxsize=1024, ttl=None, max_bytes=None, sizeof=sys.getsizeof) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.hits = 0
+        self.misses = 0
+        self._bytes = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=_MISSING):
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                value, expire_at, size = item
+                if expire_at is None or expire_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                self._pop(key)
+            self.misses += 1
+            return default
+
+    def set(self, key, value) -> None:
+        size = self.sizeof(value) if self.max_bytes is not None else 0
+        expire_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            if key in self._data:
+                self._pop(key)
+            self._data[key] = (value, expire_at, size)
+            self._bytes += size
+            while self._data and (
+                    len(self._data) > self.maxsize or (self.max_bytes is not None and self._bytes > self.max_bytes)
+            ):
+                self._pop(next(iter(self._data)))
+
+    def _pop(self, key) -> None:
+        _, _, size = self._data.pop(key)
+        self._bytes -= size
+
+    def delete(self, key) -> None:
+        with self._lock:
+            if key in self._data:
+                self._pop(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+def _make_key(args: tuple, kwargs: dict):
+    if kwargs:
+        return args + (_MISSING,) + tuple(sorted(kwargs.items()))
+    return args
+
+
+def cached(
+        f=None, maxsize=1024, ttl=None, max_bytes=None, key=None,
+        redis_client=None, redis_prefix=None, redis_ttl=None, codec=JsonCodec,
+):
+    """
+    缓存装饰器，支持普通函数及协程函数
+
+    :param maxsize: 本地缓存最多条数
+    :param ttl: 本地缓存过期时间（秒）
+    :param max_bytes: 本地缓存值的总大小上限（按 sys.getsizeof 估算）
+    :param key: 自定义缓存键函数，参数与被装饰函数相同，默认由全部参数组成
+    :param redis_client: 仅协程函数可用，RedisClient 实例，作为多个进程共享的二级缓存
+    :param redis_prefix: redis 二级缓存 key 的前缀，默认为函数名
+    :param redis_ttl: redis 二级缓存过期时间（秒），默认与 ttl 相同
+    :param codec: redis 二级缓存值的编解码，提供 dumps/loads，默认 JsonCodec
+
+    协程函数在同一个 key 并发未命中时只会调用一次，其他调用等待同一个结果
+
+        @cached(ttl=60)
+        def load_config(name): ...
+
+        @cached(ttl=10, redis_client=redis_client)
+        async def get_user(user_id): ...
+
+    被装饰函数的 cache 属性为本地缓存（LRUCache），cache_clear() 清空本地缓存
+    """
+    if f is None:
+        return lambda func: cached(
+            func, maxsize=maxsize, ttl=ttl, max_bytes=max_bytes, key=key, redis_client=redis_client,
+            redis_prefix=redis_prefix, redis_ttl=redis_ttl, codec=codec,
+        )
+    cache = LRUCache(maxsize=maxsize, ttl=ttl, max_bytes=max_bytes)
+    key_func = key or (lambda *args, **kwargs: _make_key(args, kwargs))
+
+    if not inspect.iscoroutinefunction(f):
+        if redis_client is not None:
+            raise MethodException('redis 二级缓存只支持协程函数')
+
+        @wraps(f)
+        def func(*args, **kwargs):
+            cache_key = key_func(*args, **kwargs)
+            value = cache.get(cache_key)
+            if value is _MISSING:
+                value = f(*args, **kwargs)
+                cache.set(cache_key, value)
+            return value
+        func.cache = cache
+        func.cache_clear = cache.clear
+        return func
+
+    import asyncio
+
+    prefix = redis_prefix or f'cached:{f.__module__}.{f.__qualname__}:'
+    expire = redis_ttl if redis_ttl is not None else ttl
+    inflight = {}
+
+    def redis_key(cache_key) -> str:
+        if isinstance(cache_key, str):
+            return f'{prefix}{cache_key}'
+        return f'{prefix}{hashlib.sha1(repr(cache_key).encode("utf-8")).hexdigest()}'
+
+    async def load(cache_key, args, kwargs):
+        try:
+            if redis_client is not None:
+                try:
+                    data = await redis_client.get(redis_key(cache_key))
+                except Exception as e:
+                    data = None
+                    logger.warning('cached redis get failed: %r', e)
+                if data is not None:
+                    value = codec.loads(data)
+                    cache.set(cache_key, value)
+                    return value
+            value = await f(*args, **kwargs)
+            cache.set(cache_key, value)
+            if redis_client is not None:
+                try:
+                    data = codec.dumps(value)
+                    if expire:
+                        await redis_client.setex(redis_key(cache_key), expire, data)
+                    else:
+                        await redis_client.set(redis_key(cache_key), data)
+                except Exception as e:
+                    logger.warning('cached redis set failed: %r', e)
+            return value
+        finally:
+            inflight.pop(cache_key, None)
+
+    @wraps(f)
+    async def async_func(*args, **kwargs):
+        cache_key = key_func(*args, **kwargs)
+        value = cache.get(cache_key)
+        if value is not _MISSING:
+            return value
+        task = inflight.get(cache_key)
+        if task is None:
+            task = inflight[cache_key] = asyncio.ensure_future(load(cache_key, args, kwargs))
+        # 调用方被取消时不影响其他等待同一结果的调用
+        return await asyncio.shield(task)
+    async_func.cache = cache
+    async_func.cache_clear = cache.clear
+    return async_func
+
+
 if __name__ == '__main__':
     @decorate
     def test_decorate():
         pass
 
     test_decorate()
+    log_stats()
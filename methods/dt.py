@@ -1,11 +1,65 @@
 # -*- coding: utf-8 -*-
+from __future__ import annotations
+
 import calendar
 import time
 from datetime import date, datetime, timedelta
+from functools import lru_cache
+
+from methods.exceptions import MethodException
+from methods.lazy import lazy_import
 
+np = lazy_import('numpy')
+pytz = lazy_import('pytz')
 
-def now() -> datetime:
-    return datetime.now()
+
+def now(tz=None) -> datetime:
+    """
+    获取当前时间
+
+    :param tz: 时区名称（如 Asia/Shanghai）或 tzinfo，指定时返回带时区的时间，否则返回本地时间（不带时区）
+    """
+    if tz is None:
+        return datetime.now()
+    return datetime.now(get_timezone(tz))
+
+
+def utcnow() -> datetime:
+    """
+    获取当前 UTC 时间（带时区）
+    """
+    return datetime.now(pytz.utc)
+
+
+@lru_cache(maxsize=None)
+def _timezone(name: str):
+    return pytz.timezone(name)
+
+
+def get_timezone(tz):
+    """
+    获取时区对象，tz 可以是时区名称或 tzinfo
+    """
+    if isinstance(tz, str):
+        return _timezone(tz)
+    return tz
+
+
+def localize(dt: datetime, tz) -> datetime:
+    """
+    为不带时区的时间指定时区
+    """
+    tz = get_timezone(tz)
+    if hasattr(tz, 'localize'):
+        return tz.localize(dt)
+    return dt.replace(tzinfo=tz)
+
+
+def to_timezone(dt: datetime, tz) -> datetime:
+    """
+    转换到指定时区，不带时区的时间视为本地时间
+    """
+    return dt.astimezone(get_timezone(tz))
 
 
 def timestamp(dt: datetime = None) -> int:
@@ -16,7 +70,75 @@ def timestamp(dt: datetime = None) -> int:
     """
     if dt:
         return int(dt.timestamp() * 1000)
-    return int(time.time() * 1000)
+    return time.time_ns() // 1000000
+
+
+def timestamp_us() -> int:
+    """
+    获取当前 UTC 时间戳，单位：微秒
+    """
+    return time.time_ns() // 1000
+
+
+def timestamp_ns() -> int:
+    """
+    获取当前 UTC 时间戳，单位：纳秒
+    """
+    return time.time_ns()
+
+
+def monotonic_ns() -> int:
+    """
+    单调高精度时钟，单位：纳秒
+
+    不受系统时间调整（NTP 等）影响，只能用于计算时间间隔，不能转换为日期
+    """
+    return time.perf_counter_ns()
+
+
+class Stopwatch:
+    """
+    基于单调时钟的计时器
+
+        with Stopwatch() as sw:
+            ...
+        sw.elapsed_ms
+    """
+
+    def __init__(self) -> None:
+        self.start_ns = monotonic_ns()
+        self.stop_ns = None
+
+    def restart(self) -> None:
+        self.start_ns = monotonic_ns()
+        self.stop_ns = None
+
+    def stop(self) -> int:
+        self.stop_ns = monotonic_ns()
+        return self.elapsed_ns
+
+    @property
+    def elapsed_ns(self) -> int:
+        end = self.stop_ns if self.stop_ns is not None else monotonic_ns()
+        return end - self.start_ns
+
+    @property
+    def elapsed_ms(self) -> float:
+        return self.elapsed_ns / 1e6
+
+    @property
+    def elapsed(self) -> float:
+        """
+        单位：秒
+        """
+        return self.elapsed_ns / 1e9
+
+    def __enter__(self):
+        self.restart()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
 
 
 def weekday(dt: datetime) -> int:
@@ -45,7 +167,7 @@ def today2str(str_format="%Y%m%d") -> str:
     """
     日期转字符串
     """
-    return today().strftime(str_format)
+    return date2str(today(), str_format)
 
 
 def date2int(dt: datetime) -> int:
@@ -58,10 +180,82 @@ def date2int(dt: datetime) -> int:
 def date2str(dt: datetime, str_format="%Y-%m-%d") -> str:
     """
     日期转字符串
+
+    常用格式直接拼接，只包含日期的格式按 (年, 月, 日, 格式) 缓存结果
     """
+    if str_format == '%Y-%m-%d %H:%M:%S' and isinstance(dt, datetime):
+        return f'{dt.year:04d}-{dt.month:02d}-{dt.day:02d} {dt.hour:02d}:{dt.minute:02d}:{dt.second:02d}'
+    if _is_date_format(str_format):
+        return _format_date(dt.year, dt.month, dt.day, str_format)
     return dt.strftime(str_format)
 
 
+# 日期格式化、解析缓存的容量
+DATE_CACHE_SIZE = 4096
+
+# 只由日期决定结果的格式符，包含其他格式符（含 %-d 等带标志的形式）的格式不缓存
+_DATE_DIRECTIVES = frozenset('YmdyjaAbBwuUW%')
+
+
+@lru_cache(maxsize=64)
+def _is_date_format(str_format: str) -> bool:
+    index = str_format.find('%')
+    while index != -1:
+        if index + 1 >= len(str_format) or str_format[index + 1] not in _DATE_DIRECTIVES:
+            return False
+        index = str_format.find('%', index + 2)
+    return True
+
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def _format_date(year: int, month: int, day: int, str_format: str) -> str:
+    if str_format == '%Y%m%d':
+        return f'{year:04d}{month:02d}{day:02d}'
+    if str_format == '%Y-%m-%d':
+        return f'{year:04d}-{month:02d}-{day:02d}'
+    return date(year, month, day).strftime(str_format)
+
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def str2date(value: str, str_format="%Y-%m-%d") -> datetime:
+    """
+    字符串转日期
+
+    %Y-%m-%d、%Y%m%d、%Y-%m-%d %H:%M:%S 直接按位置解析，其他格式使用 strptime，结果会被缓存
+    """
+    if str_format == '%Y-%m-%d' and len(value) == 10 and value[4] == '-' and value[7] == '-':
+        return datetime(int(value[:4]), int(value[5:7]), int(value[8:]))
+    if str_format == '%Y%m%d' and len(value) == 8 and value.isdigit():
+        return datetime(int(value[:4]), int(value[4:6]), int(value[6:]))
+    if str_format == '%Y-%m-%d %H:%M:%S' and len(value) == 19 and value[4] == value[7] == '-' \
+            and value[10] == ' ' and value[13] == value[16] == ':':
+        return datetime(
+            int(value[:4]), int(value[5:7]), int(value[8:10]), int(value[11:13]), int(value[14:16]), int(value[17:])
+        )
+    return datetime.strptime(value, str_format)
+
+
+def int2date(value: int) -> datetime:
+    """
+    int（YYYYMMDD）转日期
+    """
+    return datetime(value // 10000, value // 100 % 100, value % 100)
+
+
+def int2str(value: int, str_format="%Y-%m-%d") -> str:
+    """
+    int（YYYYMMDD）转字符串
+    """
+    return _format_date(value // 10000, value // 100 % 100, value % 100, str_format)
+
+
+def str2int(value: str, str_format="%Y-%m-%d") -> int:
+    """
+    字符串转 int（YYYYMMDD）
+    """
+    return date2int(str2date(value, str_format))
+
+
 def create_date(year: int, month: int, day: int) -> datetime:
     """
     创建日期
@@ -109,7 +303,7 @@ def quarter(dt: datetime) -> int:
     """
     month = dt.month
 
-    return month // 3
+    return (month - 1) // 3 + 1
 
 
 def quarter_start_date(dt: datetime) -> datetime:
@@ -118,7 +312,7 @@ def quarter_start_date(dt: datetime) -> datetime:
     """
     return create_date(
         dt.year,
-        ((quarter(dt) + 2) // 3 - 1) * 3 + 1,
+        (quarter(dt) - 1) * 3 + 1,
         1
     )
 
@@ -144,22 +338,51 @@ def weekday_in_interval(
     :param format: 当case_func 指定为str时，用于格式化的模式
     :param case_func: 指定返回数据的类型（datetime、str）
     """
-    item_list = []
-    while start_date <= end_date:
-        if weekday(start_date) == day:
-            if case_func == datetime:
-                item_list.append(start_date)
-            else:
-                item_list.append(start_date.strftime(format))
-        start_date = date_by_delta(start_date, days=1)
-    return item_list
+    return list(iter_weekday_in_interval(day, start_date, end_date, case_func=case_func, format=format))
+
+
+def _first_weekday(day: int, start_date: datetime) -> datetime:
+    if not 1 <= day <= 7:
+        raise MethodException('day 必须在 1-7 之间')
+    return start_date + timedelta(days=(day - weekday(start_date)) % 7)
+
+
+def iter_weekday_in_interval(
+        day: int, start_date: datetime, end_date: datetime, case_func=str, format='%Y%m%d',
+):
+    """
+    weekday_in_interval 的生成器版本
+
+    直接定位到第一个符合条件的日期，之后每次前进 7 天
+    """
+    current = _first_weekday(day, start_date)
+    step = timedelta(days=7)
+    while current <= end_date:
+        if case_func == datetime:
+            yield current
+        else:
+            yield current.strftime(format)
+        current += step
+
+
+def np_weekday_in_interval(day: int, start_date: datetime, end_date: datetime) -> np.ndarray:
+    """
+    weekday_in_interval 的向量化版本，返回 datetime64 数组
+
+    需要字符串时可配合 np_date2str 使用
+    """
+    first = _first_weekday(day, start_date)
+    if first > end_date:
+        return np.array([], dtype='datetime64[us]')
+    count = (end_date - first) // timedelta(days=7) + 1
+    return np.datetime64(first, 'us') + np.arange(count) * np.timedelta64(7, 'D')
 
 
 def week_in_year(dt: datetime) -> int:
     """
-    返回指定日期是一年的第几周
+    返回指定日期是一年的第几周（ISO 周）
     """
-    return dt.isocalendar()[0]
+    return dt.isocalendar()[1]
 
 
 def day_in_year(dt: datetime) -> int:
@@ -181,6 +404,550 @@ def is_leap_year(year) -> bool:
     return False
 
 
+def _is_aware(values) -> bool:
+    if getattr(getattr(values, 'dtype', None), 'tz', None) is not None:
+        return True
+    if hasattr(values, 'to_numpy'):
+        values = values.to_numpy()
+    values = np.asarray(values)
+    return values.dtype.kind == 'O' and any(getattr(item, 'tzinfo', None) is not None for item in values.flat)
+
+
+def to_datetime64(values, utc=False) -> np.ndarray:
+    """
+    将 datetime 列表、datetime64 数组、pandas Series/DatetimeIndex 转为 datetime64 数组
+
+    NOTE datetime64 不带时区，带时区的输入默认取所在时区的时间，与 date2int 等标量函数一致
+    :param utc: 带时区的输入是否转换为 UTC 时间
+    """
+    if getattr(getattr(values, 'dtype', None), 'tz', None) is not None:
+        import pandas as pd
+
+        index = pd.DatetimeIndex(values)
+        if utc:
+            index = index.tz_convert('UTC')
+        return index.tz_localize(None).to_numpy()
+    if hasattr(values, 'to_numpy'):
+        values = values.to_numpy()
+    values = np.asarray(values)
+    if values.dtype.kind == 'O' and any(getattr(item, 'tzinfo', None) is not None for item in values.flat):
+        items = [
+            (item.astimezone(pytz.utc) if utc else item).replace(tzinfo=None)
+            if getattr(item, 'tzinfo', None) is not None else item
+            for item in values.ravel()
+        ]
+        values = np.array(items, dtype=object).reshape(values.shape)
+    if values.dtype.kind != 'M':
+        values = values.astype('datetime64[ns]')
+    return values
+
+
+def _split_date(values) -> tuple:
+    """
+    拆分为 (天, 年, 月) 三个 datetime64 数组，精度分别为 D、Y、M
+    """
+    days = to_datetime64(values).astype('datetime64[D]')
+    return days, days.astype('datetime64[Y]'), days.astype('datetime64[M]')
+
+
+def np_date2int(values) -> np.ndarray:
+    """
+    date2int 的向量化版本，返回 YYYYMMDD 格式的 int 数组
+    """
+    days, years, months = _split_date(values)
+    year = years.astype(np.int64) + 1970
+    month = months.astype(np.int64) % 12 + 1
+    day = (days - months.astype('datetime64[D]')).astype(np.int64) + 1
+    return year * 10000 + month * 100 + day
+
+
+def np_weekday(values) -> np.ndarray:
+    """
+    weekday 的向量化版本（1-7）
+    """
+    days = to_datetime64(values).astype('datetime64[D]').astype(np.int64)
+    # 1970-01-01 是星期四
+    return (days + 3) % 7 + 1
+
+
+def np_quarter(values) -> np.ndarray:
+    """
+    quarter 的向量化版本
+    """
+    _, _, months = _split_date(values)
+    return months.astype(np.int64) % 12 // 3 + 1
+
+
+def np_day_in_year(values) -> np.ndarray:
+    """
+    day_in_year 的向量化版本
+    """
+    days, years, _ = _split_date(values)
+    return (days - years.astype('datetime64[D]')).astype(np.int64) + 1
+
+
+def np_timestamp(values, tz=None) -> np.ndarray:
+    """
+    timestamp 的向量化版本，单位：毫秒
+
+    :param tz: 不带时区的 values 所在的时区，默认与 timestamp 相同，按本地时间处理；带时区的 values 使用自身的时区
+    """
+    if _is_aware(values):
+        values = to_datetime64(values, utc=True)
+    else:
+        values = to_datetime64(values)
+        if tz != 'UTC':
+            values = np_tz_convert(values, 'UTC', from_tz=tz)
+    return values.astype('datetime64[ms]').astype(np.int64)
+
+
+@lru_cache(maxsize=None)
+def _local_timezone():
+    # 按 TZ 环境变量或 /etc/localtime 加载时区文件，pandas 无法正确处理 tzlocal 在夏令时切换附近的时间
+    from dateutil.tz import gettz, tzlocal
+
+    return gettz() or tzlocal()
+
+
+def np_tz_convert(values, to_tz, from_tz='UTC') -> np.ndarray:
+    """
+    将 from_tz 时区的 datetime64 数组批量转换为 to_tz 时区的时间（结果不带时区）
+
+    时区为 None 时表示本地时区。夏令时切换附近与 datetime.timestamp（fold=0）一致：
+    有歧义的时间取第一次出现，不存在的时间按切换前的偏移量计算
+    """
+    import pandas as pd
+
+    from_tz = _local_timezone() if from_tz is None else get_timezone(from_tz)
+    to_tz = _local_timezone() if to_tz is None else get_timezone(to_tz)
+    index = pd.DatetimeIndex(to_datetime64(values).ravel())
+    localized = index.tz_localize(from_tz, ambiguous=np.ones(len(index), dtype=bool), nonexistent='NaT')
+    utc = localized.tz_convert('UTC').tz_localize(None)
+    gap = np.asarray(localized.isna() & ~index.isna())
+    if gap.any():
+        # 切换前一天的偏移量即切换前的偏移量
+        before = (index[gap] - pd.Timedelta(days=1)).tz_localize(
+            from_tz, ambiguous=np.ones(int(gap.sum()), dtype=bool), nonexistent='shift_forward'
+        )
+        offsets = before.tz_localize(None) - before.tz_convert('UTC').tz_localize(None)
+        utc = utc.to_numpy().copy()
+        utc[gap] = (index[gap] - offsets).to_numpy()
+        utc = pd.DatetimeIndex(utc)
+    result = utc.tz_localize('UTC').tz_convert(to_tz).tz_localize(None).to_numpy()
+    return result.reshape(np.shape(values))
+
+
+def np_date2str(values, str_format='%Y-%m-%d') -> np.ndarray:
+    """
+    date2str 的向量化版本
+
+    %Y-%m-%d、%Y%m%d、%Y-%m-%d %H:%M:%S 直接由 numpy 生成，其他格式逐个调用 strftime
+    """
+    values = to_datetime64(values)
+    if str_format == '%Y-%m-%d':
+        return np.datetime_as_string(values, unit='D')
+    if str_format == '%Y%m%d':
+        return np_date2int(values).astype(str)
+    if str_format == '%Y-%m-%d %H:%M:%S':
+        return np.char.replace(np.datetime_as_string(values, unit='s'), 'T', ' ')
+    items = values.astype('datetime64[us]').astype(object)
+    return np.array([item.strftime(str_format) for item in np.ravel(items)]).reshape(values.shape)
+
+
+def np_int2date(values) -> np.ndarray:
+    """
+    int（YYYYMMDD）数组转 datetime64[D] 数组
+    """
+    values = np.asarray(values, dtype=np.int64)
+    months = (values // 10000 - 1970) * 12 + values // 100 % 100 - 1
+    return months.astype('datetime64[M]').astype('datetime64[D]') + (values % 100 - 1)
+
+
+def np_int2str(values, str_format="%Y-%m-%d") -> np.ndarray:
+    """
+    int（YYYYMMDD）数组转字符串数组
+    """
+    if str_format == '%Y%m%d':
+        return np.asarray(values, dtype=np.int64).astype(str)
+    return np_date2str(np_int2date(values), str_format)
+
+
+# 可以按位置直接解析的格式：(长度, {位置: 分隔符})，其他位置均为数字
+_FIXED_LAYOUTS = {
+    '%Y-%m-%d': (10, {4: '-', 7: '-'}),
+    '%Y%m%d': (8, {}),
+    '%Y-%m-%d %H:%M:%S': (19, {4: '-', 7: '-', 10: ' ', 13: ':', 16: ':'}),
+}
+
+
+def _match_layout(values: np.ndarray, str_format: str) -> bool:
+    """
+    所有字符串是否都符合 str_format 的固定布局
+    """
+    size, separators = _FIXED_LAYOUTS[str_format]
+    if not values.size:
+        return True
+    if not (np.char.str_len(values) == size).all():
+        return False
+    chars = values.astype(f'U{size}').view('U1').reshape(-1, size)
+    for position, separator in separators.items():
+        if not (chars[:, position] == separator).all():
+            return False
+    digits = [position for position in range(size) if position not in separators]
+    return bool(np.char.isdigit(chars[:, digits]).all())
+
+
+def np_str2date(values, str_format="%Y-%m-%d") -> np.ndarray:
+    """
+    字符串数组转 datetime64 数组
+
+    常用格式在所有字符串都符合格式时批量解析，否则逐个解析，不符合格式时与 str2date 一样抛出 ValueError
+    """
+    values = np.asarray(values, dtype=str)
+    if str_format in _FIXED_LAYOUTS and _match_layout(values, str_format):
+        if str_format == '%Y-%m-%d':
+            return values.astype('datetime64[D]')
+        if str_format == '%Y%m%d':
+            return np_int2date(values.astype(np.int64))
+        return np.char.replace(values, ' ', 'T').astype('datetime64[s]')
+    return np.array([str2date(value, str_format) for value in np.ravel(values)], dtype='datetime64[us]') \
+        .reshape(values.shape)
+
+
+def np_str2int(values, str_format="%Y-%m-%d") -> np.ndarray:
+    """
+    字符串数组转 int（YYYYMMDD）数组
+    """
+    if str_format == '%Y%m%d':
+        return np.asarray(values, dtype=str).astype(np.int64)
+    return np_date2int(np_str2date(values, str_format))
+
+
+def _timestamp2datetime64(values, tz=None) -> np.ndarray:
+    values = np.asarray(values, dtype=np.int64).astype('datetime64[ms]')
+    if tz != 'UTC':
+        values = np_tz_convert(values, tz)
+    return values
+
+
+def np_timestamp2int(values, tz=None) -> np.ndarray:
+    """
+    毫秒时间戳数组转 int（YYYYMMDD）数组
+
+    :param tz: 按指定时区计算日期，默认为本地时区
+    """
+    return np_date2int(_timestamp2datetime64(values, tz))
+
+
+def np_int2timestamp(values, tz=None) -> np.ndarray:
+    """
+    int（YYYYMMDD）数组转当天 0 点的毫秒时间戳数组
+
+    :param tz: 日期所在的时区，默认为本地时区
+    """
+    return np_timestamp(np_int2date(values), tz)
+
+
+def np_timestamp2str(values, str_format="%Y-%m-%d", tz=None) -> np.ndarray:
+    """
+    毫秒时间戳数组转字符串数组
+
+    :param tz: 按指定时区格式化，默认为本地时区
+    """
+    return np_date2str(_timestamp2datetime64(values, tz), str_format)
+
+
+WINDOW_UNITS = ('hour', 'day', 'week', 'month', 'quarter', 'year')
+
+
+def floor_date(dt: datetime, unit='day') -> datetime:
+    """
+    将时间向下对齐到所属时间窗口的起点
+
+    :param unit: hour、day、week（ISO 周，从周一开始）、month、quarter、year
+    """
+    if unit == 'hour':
+        return dt.replace(minute=0, second=0, microsecond=0)
+    day_start = dt.replace(hour=0, minute=0, second=0, microsecond=0)
+    if unit == 'day':
+        return day_start
+    if unit == 'week':
+        return date_by_delta(day_start, days=1 - weekday(dt))
+    if unit == 'month':
+        return day_start.replace(day=1)
+    if unit == 'quarter':
+        return day_start.replace(month=quarter_start_date(dt).month, day=1)
+    if unit == 'year':
+        return day_start.replace(month=1, day=1)
+    raise MethodException(f'不支持的时间窗口: {unit}')
+
+
+def _add_months(dt: datetime, months: int) -> datetime:
+    month = dt.month - 1 + months
+    return dt.replace(year=dt.year + month // 12, month=month % 12 + 1)
+
+
+def shift_window(dt: datetime, unit='day', step=1) -> datetime:
+    """
+    对齐后的窗口起点向后偏移 step 个窗口
+    """
+    if unit == 'hour':
+        return date_by_delta(dt, hours=step)
+    if unit == 'day':
+        return date_by_delta(dt, days=step)
+    if unit == 'week':
+        return date_by_delta(dt, weeks=step)
+    if unit == 'month':
+        return _add_months(dt, step)
+    if unit == 'quarter':
+        return _add_months(dt, step * 3)
+    if unit == 'year':
+        return _add_months(dt, step * 12)
+    raise MethodException(f'不支持的时间窗口: {unit}')
+
+
+def iter_windows(start_date: datetime, end_date: datetime, unit='day', step=1, clip=False):
+    """
+    惰性生成 [start_date, end_date) 区间内对齐的时间窗口
+
+    每个窗口为左闭右开的 (窗口起点, 窗口终点)
+    :param step: 每个窗口包含的 unit 数量
+    :param clip: 是否将首尾窗口裁剪到 [start_date, end_date) 内
+    """
+    if step < 1:
+        raise MethodException('step 必须大于 0')
+    current = floor_date(start_date, unit)
+    while current < end_date:
+        window_end = shift_window(current, unit, step)
+        if clip:
+            yield max(current, start_date), min(window_end, end_date)
+        else:
+            yield current, window_end
+        current = window_end
+
+
+def partition_windows(windows, n: int) -> list:
+    """
+    将时间窗口切分为 n 份连续的分区，各分区的窗口数量最多相差 1，用于分配给并行的任务
+
+    :return:
+        分区列表，每个分区是一个窗口列表，窗口数少于 n 时只返回非空分区
+    """
+    windows = list(windows)
+    if n < 1:
+        raise MethodException('n 必须大于 0')
+    size, rest = divmod(len(windows), n)
+    partitions = []
+    start = 0
+    for index in range(n):
+        end = start + size + (1 if index < rest else 0)
+        if end > start:
+            partitions.append(windows[start:end])
+        start = end
+    return partitions
+
+
+def np_floor_date(values, unit='day') -> np.ndarray:
+    """
+    floor_date 的向量化版本，将时间数组中的每个时间对齐到所属窗口的起点
+    """
+    values = to_datetime64(values)
+    if unit == 'hour':
+        return values.astype('datetime64[h]')
+    if unit == 'day':
+        return values.astype('datetime64[D]')
+    if unit == 'week':
+        days = values.astype('datetime64[D]')
+        return days - (np_weekday(days) - 1).astype('timedelta64[D]')
+    if unit == 'month':
+        return values.astype('datetime64[M]')
+    if unit == 'quarter':
+        months = values.astype('datetime64[M]')
+        return months - (months.astype(np.int64) % 3).astype('timedelta64[M]')
+    if unit == 'year':
+        return values.astype('datetime64[Y]')
+    raise MethodException(f'不支持的时间窗口: {unit}')
+
+
+def np_bucket(values, start_date: datetime, unit='day', step=1) -> np.ndarray:
+    """
+    计算时间数组中每个时间所属窗口的序号，与 iter_windows(start_date, ..., unit, step) 生成的窗口顺序一致
+    """
+    origin = np_floor_date([start_date], unit)[0]
+    floors = np_floor_date(values, unit)
+    if unit in ('month', 'quarter', 'year'):
+        units = floors.astype('datetime64[M]').astype(np.int64) - origin.astype('datetime64[M]').astype(np.int64)
+        units //= {'month': 1, 'quarter': 3, 'year': 12}[unit]
+    else:
+        units = (floors - origin).astype(np.int64)
+        if unit == 'week':
+            units //= 7
+    return units // step
+
+
+def _scalar(value):
+    if np.ndim(value) == 0:
+        return int(value)
+    return value
+
+
+class Calendar:
+    """
+    预计算的日历表
+
+    覆盖 [start_year, end_year] 内的每一天，按天存储星期、ISO 周、季度起止、年内第几天、是否工作日等信息，
+    以 date2int 格式（YYYYMMDD）的 int、date、datetime 作为索引，查询均为 O(1) 的数组访问，
+    同时支持传入 YYYYMMDD 数组进行批量查询。返回的日期均为 YYYYMMDD 格式的 int
+
+        cal = Calendar(2020, 2030, holidays=[20211001, 20211002])
+        cal.next_business_day(20210930)
+        cal.business_days_between(20211001, 20211101)
+    """
+
+    def __init__(self, start_year=1970, end_year=2100, holidays=None, weekend=(6, 7)) -> None:
+        """
+        :param holidays: 节假日列表，元素可以是 YYYYMMDD、date、datetime
+        :param weekend: 周末对应的星期（1-7）
+        """
+        if start_year > end_year:
+            raise MethodException('start_year 不能大于 end_year')
+        self.start_year = start_year
+        self.end_year = end_year
+        self.weekend = tuple(weekend)
+
+        start = np.datetime64(f'{start_year:04d}-01-01', 'D')
+        months = np.arange(
+            np.datetime64(f'{start_year:04d}-01', 'M'), np.datetime64(f'{end_year + 1:04d}-02', 'M')
+        )
+        # 每个月第一天在表中的位置，最后多出的一项用于计算最后一个月的天数
+        self._month_offset = (months.astype('datetime64[D]') - start).astype(np.int64)
+        self._month_days = np.diff(self._month_offset)
+
+        self.days = np.arange(start, start + self._month_offset[-1])
+        self.date_ints = np_date2int(self.days)
+        self.weekdays = np_weekday(self.days)
+        self.days_in_year = np_day_in_year(self.days)
+        self.quarters = np_quarter(self.days)
+        years = self.date_ints // 10000
+        self.quarter_starts = years * 10000 + ((self.quarters - 1) * 3 + 1) * 100 + 1
+        end_months = self.quarters * 3
+        self.quarter_ends = years * 10000 + end_months * 100 + \
+            self._month_days[(years - start_year) * 12 + end_months - 1]
+        # ISO 周以所在周的星期四为准
+        thursdays = self.days + (4 - self.weekdays).astype('timedelta64[D]')
+        thursday_years = thursdays.astype('datetime64[Y]')
+        self.iso_years = thursday_years.astype(np.int64) + 1970
+        self.iso_weeks = (thursdays - thursday_years.astype('datetime64[D]')).astype(np.int64) // 7 + 1
+
+        self.holidays = set()
+        self.set_holidays(holidays or [])
+
+    def set_holidays(self, holidays) -> None:
+        """
+        设置节假日，并重新计算工作日
+        """
+        self.holidays = {item if isinstance(item, (int, np.integer)) else date2int(item) for item in holidays}
+        self.business = ~np.isin(self.weekdays, self.weekend) & ~np.isin(self.date_ints, list(self.holidays))
+        # _business_count[i] 为位置 i 之前的工作日数量
+        self._business_count = np.concatenate(([0], np.cumsum(self.business)))
+        self._business_positions = np.flatnonzero(self.business)
+
+    def add_holidays(self, holidays) -> None:
+        self.set_holidays(self.holidays | set(holidays))
+
+    def position(self, key):
+        """
+        获取日期在表中的位置
+        """
+        if isinstance(key, (datetime, date)):
+            year, month, day = key.year, key.month, key.day
+        else:
+            key = np.asarray(key)
+            year, month, day = key // 10000, key // 100 % 100, key % 100
+        year_index = year - self.start_year
+        if np.any((year_index < 0) | (year_index > self.end_year - self.start_year)):
+            raise MethodException(f'日期超出日历范围: {self.start_year}-{self.end_year}')
+        if np.any((month < 1) | (month > 12)):
+            raise MethodException('日期不合法')
+        month_index = year_index * 12 + month - 1
+        if np.any((day < 1) | (day > self._month_days[month_index])):
+            raise MethodException('日期不合法')
+        return self._month_offset[month_index] + day - 1
+
+    def _lookup(self, array: np.ndarray, key):
+        return _scalar(array[self.position(key)])
+
+    def weekday(self, key):
+        """
+        星期几（1-7）
+        """
+        return self._lookup(self.weekdays, key)
+
+    def week_in_year(self, key):
+        """
+        ISO 周
+        """
+        return self._lookup(self.iso_weeks, key)
+
+    def quarter(self, key):
+        return self._lookup(self.quarters, key)
+
+    def quarter_start_date(self, key):
+        return self._lookup(self.quarter_starts, key)
+
+    def quarter_end_date(self, key):
+        return self._lookup(self.quarter_ends, key)
+
+    def day_in_year(self, key):
+        return self._lookup(self.days_in_year, key)
+
+    def how_many_days(self, year: int, month: int) -> int:
+        if not self.start_year <= year <= self.end_year:
+            raise MethodException(f'日期超出日历范围: {self.start_year}-{self.end_year}')
+        return int(self._month_days[(year - self.start_year) * 12 + month - 1])
+
+    def is_leap_year(self, year: int) -> bool:
+        return self.how_many_days(year, 2) == 29
+
+    def is_business_day(self, key):
+        result = self.business[self.position(key)]
+        return bool(result) if np.ndim(result) == 0 else result
+
+    def _business_date(self, index):
+        if np.any((index < 0) | (index >= len(self._business_positions))):
+            raise MethodException(f'工作日超出日历范围: {self.start_year}-{self.end_year}')
+        return _scalar(self.date_ints[self._business_positions[index]])
+
+    def next_business_day(self, key, n=1):
+        """
+        之后的第 n 个工作日（不包含当天）
+        """
+        return self._business_date(self._business_count[self.position(key) + 1] + n - 1)
+
+    def prev_business_day(self, key, n=1):
+        """
+        之前的第 n 个工作日（不包含当天）
+        """
+        return self._business_date(self._business_count[self.position(key)] - n)
+
+    def add_business_days(self, key, n: int):
+        """
+        偏移 n 个工作日，n 为 0 且当天不是工作日时返回下一个工作日
+        """
+        if n > 0:
+            return self.next_business_day(key, n)
+        if n < 0:
+            return self.prev_business_day(key, -n)
+        position = self.position(key)
+        return self._business_date(self._business_count[position + 1] - self.business[position].astype(np.int64))
+
+    def business_days_between(self, start_key, end_key):
+        """
+        [start, end) 区间内的工作日数量，end 早于 start 时为负数
+        """
+        return _scalar(self._business_count[self.position(end_key)] - self._business_count[self.position(start_key)])
+
+
 if __name__ == '__main__':
     from methods.logger import logger
 
@@ -1,64 +1,546 @@
 # -*- coding: utf-8 -*-
-import codecs
+from __future__ import annotations
+
+import atexit
+import bz2
 import csv
+import gzip
+import hashlib
 import json
-
-import pandas as pd
+import lzma
+import os
+import pickle
+import re
+import shutil
+import threading
+import time
+import uuid
+from typing import IO, Iterator, Optional
 
 from methods.exceptions import MethodException
+from methods.lazy import lazy_import
+
+pd = lazy_import('pandas')
+
+# 各压缩格式默认的压缩等级
+COMPRESSION_LEVEL = {
+    'gzip': 6,
+    'bz2': 9,
+    'xz': 6,
+    'zstd': 3,
+}
+
+_COMPRESSION_EXTENSIONS = {
+    '.gz': 'gzip',
+    '.gzip': 'gzip',
+    '.bz2': 'bz2',
+    '.xz': 'xz',
+    '.lzma': 'xz',
+    '.zst': 'zstd',
+    '.zstd': 'zstd',
+}
+
+_COMPRESSION_MAGIC = (
+    (b'\x1f\x8b', 'gzip'),
+    (b'BZh', 'bz2'),
+    (b'\xfd7zXZ\x00', 'xz'),
+    (b'\x28\xb5\x2f\xfd', 'zstd'),
+)
+
+
+def detect_compression(filename: str, mode='r') -> Optional[str]:
+    """
+    识别文件的压缩格式
+
+    优先根据扩展名判断，读取已存在的文件时再根据文件头魔数判断
+    :return:
+        gzip、bz2、xz、zstd，非压缩文件返回 None
+    """
+    ext = os.path.splitext(filename)[1].lower()
+    if ext in _COMPRESSION_EXTENSIONS:
+        return _COMPRESSION_EXTENSIONS[ext]
+    if 'r' in mode and os.path.isfile(filename):
+        with open(filename, 'rb') as fr:
+            head = fr.read(6)
+        for magic, compression in _COMPRESSION_MAGIC:
+            if head.startswith(magic):
+                return compression
+    return None
+
+
+def open_file(
+        filename: str, mode='r', encoding='utf-8', errors='strict', newline=None,
+        compression='infer', level=None, threads=0, atomic=False, fsync=True,
+) -> IO:
+    """
+    打开文件，自动处理压缩格式
+
+    :param mode: 同内置 open，包含 b 时以二进制方式打开
+    :param compression: infer 时根据扩展名/魔数识别；None 表示不压缩；也可指定 gzip、bz2、xz、zstd
+    :param level: 压缩等级，默认取 COMPRESSION_LEVEL
+    :param threads: 压缩线程数，仅 zstd 支持（需要安装 zstandard），0 表示单线程，-1 表示使用全部 CPU
+    :param atomic: 原子写入，先写临时文件，关闭时再替换目标文件，参考 AtomicFile
+    :param fsync: 原子写入时，替换前是否将数据同步到磁盘
+    """
+    if compression == 'infer':
+        compression = detect_compression(filename, mode)
+    if atomic and 'r' not in mode:
+        return AtomicFile(
+            filename, mode, encoding=encoding, errors=errors, newline=newline,
+            compression=compression, level=level, threads=threads, fsync=fsync,
+        )
+    binary = 'b' in mode
+    text_kwargs = {} if binary else {'encoding': encoding, 'errors': errors, 'newline': newline}
+    raw_mode = mode.replace('t', '')
+    if not binary:
+        raw_mode = f'{raw_mode}t'
+    if level is None and compression:
+        level = COMPRESSION_LEVEL.get(compression)
+
+    if compression is None:
+        return open(filename, raw_mode, **text_kwargs)
+    if compression == 'gzip':
+        return gzip.open(filename, raw_mode, compresslevel=level, **text_kwargs)
+    if compression == 'bz2':
+        return bz2.open(filename, raw_mode, compresslevel=level, **text_kwargs)
+    if compression == 'xz':
+        preset = level if 'r' not in mode else None
+        return lzma.open(filename, raw_mode, preset=preset, **text_kwargs)
+    if compression == 'zstd':
+        try:
+            import zstandard
+        except ImportError:
+            raise MethodException('读写 zstd 文件需要安装 zstandard')
+        cctx = zstandard.ZstdCompressor(level=level, threads=threads)
+        return zstandard.open(filename, raw_mode, cctx=cctx, **text_kwargs)
+    raise MethodException(f'不支持的压缩格式: {compression}')
+
+
+def _fsync_path(path: str) -> None:
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    except OSError:
+        # 部分平台不支持对目录执行 fsync
+        pass
+    finally:
+        os.close(fd)
+
+
+class AtomicFile:
+    """
+    原子写入的文件
+
+    数据先写入同目录下的临时文件，close 时 fsync 后通过 rename 替换目标文件，
+    读者只会看到完整的旧文件或完整的新文件；异常退出时丢弃临时文件。
+    追加模式会先复制原文件内容
+    """
+
+    def __init__(self, filename: str, mode='w', fsync=True, **kwargs) -> None:
+        self.filename = filename
+        self.fsync = fsync
+        directory, name = os.path.split(os.path.abspath(filename))
+        self.tmp_filename = os.path.join(directory, f'.{name}.{uuid.uuid4().hex}.tmp')
+        if 'a' in mode and os.path.exists(filename):
+            shutil.copyfile(filename, self.tmp_filename)
+        # 临时文件没有目标文件的扩展名，压缩格式需要按目标文件识别
+        if kwargs.get('compression', 'infer') == 'infer':
+            kwargs['compression'] = detect_compression(filename, mode)
+        self._fw = open_file(self.tmp_filename, mode, **kwargs)
+        self.closed = False
+
+    def __getattr__(self, name):
+        return getattr(self._fw, name)
+
+    def __iter__(self):
+        return iter(self._fw)
+
+    def write(self, data):
+        return self._fw.write(data)
+
+    def close(self) -> None:
+        """
+        提交写入内容
+        """
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self._fw.close()
+            if os.path.exists(self.filename):
+                shutil.copymode(self.filename, self.tmp_filename)
+            if self.fsync:
+                _fsync_path(self.tmp_filename)
+            os.replace(self.tmp_filename, self.filename)
+        except BaseException:
+            self._remove_tmp()
+            raise
+        if self.fsync and os.name == 'posix':
+            _fsync_path(os.path.dirname(os.path.abspath(self.filename)))
+
+    def discard(self) -> None:
+        """
+        放弃写入内容，目标文件保持不变
+        """
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self._fw.close()
+        finally:
+            self._remove_tmp()
+
+    def _remove_tmp(self) -> None:
+        if os.path.exists(self.tmp_filename):
+            os.remove(self.tmp_filename)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+
+class BatchWriter:
+    """
+    批量追加写入
+
+    文件保持以追加模式打开，行先缓存在内存中，达到 batch_size 行或距上次写入超过
+    flush_interval 秒时才一次性写入，可选在每次写入后 fsync，将大量小的追加写合并为少量磁盘操作。
+    未满一批的数据最迟在 flush_interval 秒后由后台定时器写入，不依赖下一次 write
+    """
+
+    def __init__(
+            self, filename: str, batch_size=1000, flush_interval=1.0, fsync=False,
+            encoding='utf-8', errors='ignore', compression='infer', level=None, threads=0,
+    ) -> None:
+        self.filename = filename
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._timer = None
+        self._fw = open_file(
+            filename, 'a', encoding=encoding, errors=errors, compression=compression, level=level, threads=threads
+        )
+
+    def write(self, row) -> None:
+        if not isinstance(row, (str, list)):
+            raise MethodException('待保存内容不合法')
+        with self._lock:
+            if isinstance(row, str):
+                self._buffer.append(row)
+            else:
+                self._buffer.extend(row)
+            if len(self._buffer) >= self.batch_size or time.monotonic() - self._last_flush >= self.flush_interval:
+                self._flush()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.flush_interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
 
+    def flush(self) -> None:
+        with self._lock:
+            self._flush()
 
-def read_csv(filename: str) -> list:
-    fr = csv.reader(codecs.open(filename, 'r'))
-    row_list = []
-    for row in fr:
-        row_list.append(row)
-    return row_list
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._last_flush = time.monotonic()
+        if not self._buffer or self._fw.closed:
+            return
+        self._fw.write(''.join(f'{line}\n' for line in self._buffer))
+        self._buffer = []
+        self._fw.flush()
+        if self.fsync:
+            os.fsync(self._fw.fileno())
 
+    def close(self) -> None:
+        with self._lock:
+            if self._fw.closed:
+                return
+            try:
+                self._flush()
+            finally:
+                self._fw.close()
 
-def save_csv(rows: list, filename='template.csv', headers=None) -> None:
-    writer = csv.writer(codecs.open(filename, 'w'))
-    if headers:
-        writer.writerow(headers)
-    for row in rows:
-        writer.writerow(row)
+    def __enter__(self):
+        return self
 
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
 
-def pd_read_csv(filename: str, **kwargs) -> pd.DataFrame:
-    return pd.DataFrame(filename, **kwargs)
 
+_batch_writers = {}
+_batch_writers_lock = threading.Lock()
 
-def pd_save_csv(df: pd.DataFrame, filename='template.csv', **kwargs) -> None:
-    df.to_csv(filename, **kwargs)
 
+def get_batch_writer(filename: str, **kwargs) -> BatchWriter:
+    """
+    获取 filename 对应的共享 BatchWriter，进程退出时自动写入剩余数据
+    """
+    key = os.path.abspath(filename)
+    with _batch_writers_lock:
+        writer = _batch_writers.get(key)
+        if writer is None or writer._fw.closed:
+            writer = _batch_writers[key] = BatchWriter(filename, **kwargs)
+        return writer
 
-def read_json(filename: str) -> dict:
-    with codecs.open(filename, 'r') as fr:
+
+@atexit.register
+def close_batch_writers() -> None:
+    """
+    写入并关闭所有共享 BatchWriter
+    """
+    with _batch_writers_lock:
+        writers = list(_batch_writers.values())
+        _batch_writers.clear()
+    for writer in writers:
+        writer.close()
+
+
+def iter_csv(filename: str, encoding='utf-8', compression='infer', **kwargs) -> Iterator[list]:
+    """
+    逐行读取 csv 文件
+    """
+    with open_file(filename, 'r', encoding=encoding, newline='', compression=compression) as fr:
+        for row in csv.reader(fr, **kwargs):
+            yield row
+
+
+def read_csv(filename: str, encoding='utf-8', compression='infer', **kwargs) -> list:
+    return list(iter_csv(filename, encoding=encoding, compression=compression, **kwargs))
+
+
+def save_csv(
+        rows: list, filename='template.csv', headers=None, encoding='utf-8',
+        compression='infer', level=None, threads=0, atomic=False,
+) -> None:
+    with open_file(
+            filename, 'w', encoding=encoding, newline='', compression=compression, level=level, threads=threads,
+            atomic=atomic,
+    ) as fw:
+        writer = csv.writer(fw)
+        if headers:
+            writer.writerow(headers)
+        for row in rows:
+            writer.writerow(row)
+
+
+# 解析缓存默认存放目录及容量上限（字节）
+PARSE_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'methods', 'parse')
+PARSE_CACHE_SIZE = 2 << 30
+# 解析缓存生成的文件名，淘汰时只删除这些文件，缓存目录中的其他文件不受影响
+_PARSE_CACHE_FILE = re.compile(r'^[0-9a-f]{40}\.(feather|npy|pkl|columns\.json)$')
+
+
+def _parse_cache_key(filename: str, options: dict) -> str:
+    stat = os.stat(filename)
+    payload = json.dumps(
+        [os.path.abspath(filename), stat.st_mtime_ns, stat.st_size, options], sort_keys=True, default=repr
+    )
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def _load_parse_cache(path: str) -> Optional[pd.DataFrame]:
+    for ext in ('.feather', '.npy', '.pkl'):
+        cache_file = f'{path}{ext}'
+        if not os.path.isfile(cache_file):
+            continue
+        os.utime(cache_file)
+        if ext == '.feather':
+            from pyarrow import feather
+            return feather.read_table(cache_file, memory_map=True).to_pandas()
+        if ext == '.npy':
+            import numpy as np
+            columns_file = f'{path}.columns.json'
+            if not os.path.isfile(columns_file):
+                return None
+            os.utime(columns_file)
+            with open(columns_file, 'r', encoding='utf-8') as fr:
+                columns = json.load(fr)
+            return pd.DataFrame(np.load(cache_file, mmap_mode='c'), columns=columns, copy=False)
+        with open(cache_file, 'rb') as fr:
+            return pickle.load(fr)
+    return None
+
+
+def _save_parse_cache(path: str, df: pd.DataFrame) -> None:
+    try:
+        import pyarrow
+        from pyarrow import feather
+    except ImportError:
+        pyarrow = None
+    if pyarrow is not None:
+        ext = '.feather'
+    elif len(set(df.dtypes)) == 1 and df.dtypes.iloc[0].kind in 'biuf' \
+            and all(isinstance(column, str) for column in df.columns) \
+            and isinstance(df.index, pd.RangeIndex) and df.index.start == 0 and df.index.step == 1:
+        ext = '.npy'
+    else:
+        ext = '.pkl'
+
+    tmp_file = f'{path}.{os.getpid()}.tmp'
+    try:
+        if ext == '.feather':
+            # 不压缩，读取时才能直接内存映射
+            table = pyarrow.Table.from_pandas(df)
+            feather.write_feather(table, tmp_file, compression='uncompressed')
+        elif ext == '.npy':
+            import numpy as np
+            with open(tmp_file, 'wb') as fw:
+                np.save(fw, df.to_numpy())
+            with open(f'{path}.columns.json', 'w', encoding='utf-8') as fw:
+                json.dump([str(column) for column in df.columns], fw)
+        else:
+            with open(tmp_file, 'wb') as fw:
+                pickle.dump(df, fw, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file, f'{path}{ext}')
+    except Exception:
+        # 缓存失败不影响正常读取
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+
+
+def evict_parse_cache(cache_dir: str = None, max_size: int = None) -> int:
+    """
+    按最近使用时间淘汰解析缓存，直到总大小不超过 max_size，只删除解析缓存生成的文件
+    :return:
+        被删除的文件数量
+    """
+    cache_dir = cache_dir or PARSE_CACHE_DIR
+    max_size = PARSE_CACHE_SIZE if max_size is None else max_size
+    if not os.path.isdir(cache_dir):
+        return 0
+    entries = []
+    for name in os.listdir(cache_dir):
+        if not _PARSE_CACHE_FILE.match(name):
+            continue
+        stat = os.stat(os.path.join(cache_dir, name))
+        entries.append((stat.st_mtime, stat.st_size, name))
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for _, size, name in sorted(entries):
+        if total <= max_size:
+            break
+        os.remove(os.path.join(cache_dir, name))
+        total -= size
+        removed += 1
+    return removed
+
+
+def clear_parse_cache(cache_dir: str = None) -> int:
+    """
+    清空解析缓存
+    """
+    return evict_parse_cache(cache_dir, max_size=0)
+
+
+def pd_read_csv(filename: str, compression='infer', cache=False, cache_dir=None, **kwargs) -> pd.DataFrame:
+    """
+    读取 csv 为 DataFrame
+
+    :param cache: 是否启用解析缓存。首次读取后保存一份列式二进制副本
+        （安装 pyarrow 时为 Feather，否则为 npy/pickle），
+        以 路径 + 修改时间 + 大小 + 读取参数 作为缓存键，之后的读取直接内存映射加载
+    :param cache_dir: 缓存目录，默认 PARSE_CACHE_DIR
+    """
+    if cache:
+        cache_dir = cache_dir or PARSE_CACHE_DIR
+        path = os.path.join(cache_dir, _parse_cache_key(filename, dict(kwargs, compression=compression)))
+        df = _load_parse_cache(path)
+        if df is not None:
+            return df
+        df = pd_read_csv(filename, compression=compression, **kwargs)
+        os.makedirs(cache_dir, exist_ok=True)
+        _save_parse_cache(path, df)
+        evict_parse_cache(cache_dir)
+        return df
+
+    if compression == 'infer':
+        compression = detect_compression(filename)
+    if compression is None:
+        return pd.read_csv(filename, **kwargs)
+    with open_file(filename, 'rb', compression=compression) as fr:
+        return pd.read_csv(fr, **kwargs)
+
+
+def pd_save_csv(
+        df: pd.DataFrame, filename='template.csv', encoding='utf-8',
+        compression='infer', level=None, threads=0, atomic=False, **kwargs
+) -> None:
+    if compression == 'infer':
+        compression = detect_compression(filename, 'w')
+    if compression is None and not atomic:
+        df.to_csv(filename, encoding=encoding, **kwargs)
+        return
+    with open_file(
+            filename, 'w', encoding=encoding, newline='', compression=compression, level=level, threads=threads,
+            atomic=atomic,
+    ) as fw:
+        df.to_csv(fw, **kwargs)
+
+
+def read_json(filename: str, encoding='utf-8', compression='infer') -> dict:
+    with open_file(filename, 'r', encoding=encoding, compression=compression) as fr:
         return json.load(fr)
 
 
-def save_json(row: dict, filename='template.json', indent=2, ensure_ascii=True, **kwargs) -> None:
-    with codecs.open(filename, 'w') as fw:
+def save_json(
+        row: dict, filename='template.json', indent=2, ensure_ascii=True, encoding='utf-8',
+        compression='infer', level=None, threads=0, atomic=False, **kwargs
+) -> None:
+    with open_file(
+            filename, 'w', encoding=encoding, compression=compression, level=level, threads=threads, atomic=atomic
+    ) as fw:
         content = json.dumps(row, indent=indent, ensure_ascii=ensure_ascii, **kwargs)
         fw.write(f'{content}')
 
 
-def read_txt(filename: str, mode='r', encoding='utf-8', errors='ignore') -> list:
-    row_list = []
-    with codecs.open(filename, mode=mode, encoding=encoding, errors=errors) as fr:
-        for line in fr.readlines():
+def iter_txt(filename: str, mode='r', encoding='utf-8', errors='ignore', compression='infer') -> Iterator[str]:
+    """
+    逐行读取文本文件，跳过空行
+    """
+    with open_file(filename, mode=mode, encoding=encoding, errors=errors, compression=compression) as fr:
+        for line in fr:
             line = line.strip()
             if not line:
                 continue
-            row_list.append(line)
-    return row_list
+            yield line
+
+
+def read_txt(filename: str, mode='r', encoding='utf-8', errors='ignore', compression='infer') -> list:
+    return list(iter_txt(filename, mode=mode, encoding=encoding, errors=errors, compression=compression))
+
 
+def save_txt(
+        row, filename='template.txt', mode='w', encoding='utf-8', errors='ignore',
+        compression='infer', level=None, threads=0, atomic=False, batch=False,
+) -> None:
+    """
+    保存文本文件，每个元素一行
 
-def save_txt(row, filename='template.txt', mode='w', encoding='utf-8', errors='ignore') -> None:
+    :param atomic: 原子写入，参考 AtomicFile
+    :param batch: 仅追加模式有效，写入共享的 BatchWriter，由其合并后批量落盘
+    """
     if not isinstance(row, (str, list)):
         raise MethodException('待保存内容不合法')
+    if batch and mode == 'a':
+        get_batch_writer(
+            filename, encoding=encoding, errors=errors, compression=compression, level=level, threads=threads
+        ).write(row)
+        return
     if isinstance(row, str):
         row = [row]
-    with codecs.open(filename, mode=mode, encoding=encoding, errors=errors) as fw:
+    with open_file(
+            filename, mode=mode, encoding=encoding, errors=errors, compression=compression, level=level,
+            threads=threads, atomic=atomic,
+    ) as fw:
         for line in row:
             fw.write(f'{line}\n')
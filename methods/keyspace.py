@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+"""
+redis keyspace 分析
+
+通过 SCAN 遍历（或抽样）key，以管道批量查询 TYPE、MEMORY USAGE、TTL 及元素数量，
+按 key 前缀模式汇总内存占用，找出最大的 key、没有设置过期时间的 key 以及各类型的总量。
+所有命令受每秒操作数预算限制，可以在生产环境的主节点上运行
+
+    report = await analyze_keyspace(redis_client, ops_per_second=2000)
+    report.save('keyspace')  # keyspace_patterns.csv、keyspace_biggest.csv、keyspace_no_ttl.csv、keyspace.json
+"""
+import asyncio
+import heapq
+import re
+import time
+from typing import Optional
+
+from methods.bridge import Progress
+from methods.files import save_csv, save_json
+from methods.redis import RedisClient
+
+# 被视为 id 的 key 片段：数字、十六进制串、uuid
+_ID_PATTERN = re.compile(
+    r'^(\d+'
+    r'|[0-9a-fA-F]{16,}'
+    r'|[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12})$'
+)
+
+_LENGTH_COMMANDS = {
+    'string': 'strlen',
+    'list': 'llen',
+    'set': 'scard',
+    'zset': 'zcard',
+    'hash': 'hlen',
+    'stream': 'xlen',
+}
+
+
+def _decode(value):
+    if isinstance(value, bytes):
+        return value.decode('utf-8', errors='replace')
+    return value
+
+
+def key_pattern(key: str, separator=':', depth=2) -> str:
+    """
+    将 key 归纳为前缀模式，id 片段替换为 *，超过 depth 的部分合并为 *
+
+        user:123:profile -> user:*:profile (depth=3)
+        order:20210101:1 -> order:*:*      (depth=2)
+    """
+    parts = key.split(separator)
+    pattern = ['*' if _ID_PATTERN.match(part) else part for part in parts[:depth]]
+    if len(parts) > depth:
+        pattern.append('*')
+    return separator.join(pattern)
+
+
+class OpsBudget:
+    """
+    每秒操作数预算（令牌桶），超出时等待
+    """
+
+    def __init__(self, ops_per_second: float = None, burst: int = None) -> None:
+        self.ops_per_second = ops_per_second
+        self.burst = burst or ops_per_second
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+
+    async def acquire(self, ops: int) -> None:
+        if not self.ops_per_second:
+            return
+        while True:
+            current = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (current - self._updated) * self.ops_per_second)
+            self._updated = current
+            # 单次请求超过 burst 时，令牌足够 burst 即放行，避免永久等待
+            if self._tokens >= min(ops, self.burst):
+                self._tokens -= ops
+                return
+            await asyncio.sleep((min(ops, self.burst) - self._tokens) / self.ops_per_second)
+
+
+class KeyspaceReport:
+    """
+    keyspace 分析结果，内存单位：字节，ttl 单位：秒（-1 表示未设置过期时间）
+    """
+
+    def __init__(self, top=100) -> None:
+        self.top = top
+        self.keys = 0
+        self.memory = 0
+        self.started = time.time()
+        self.elapsed = 0.0
+        self.patterns = {}
+        self.types = {}
+        self._biggest = []
+        self._no_ttl = []
+
+    def add(
+            self, key: str, key_type: str, memory: Optional[int], ttl: int, length: Optional[int], pattern: str,
+    ) -> None:
+        memory = memory or 0
+        self.keys += 1
+        self.memory += memory
+        item = self.patterns.get(pattern)
+        if item is None:
+            item = self.patterns[pattern] = {
+                'pattern': pattern, 'keys': 0, 'memory': 0, 'no_ttl': 0, 'length': 0, 'types': {},
+            }
+        item['keys'] += 1
+        item['memory'] += memory
+        item['length'] += length or 0
+        item['types'][key_type] = item['types'].get(key_type, 0) + 1
+        if ttl == -1:
+            item['no_ttl'] += 1
+        totals = self.types.get(key_type)
+        if totals is None:
+            totals = self.types[key_type] = {'type': key_type, 'keys': 0, 'memory': 0, 'length': 0, 'no_ttl': 0}
+        totals['keys'] += 1
+        totals['memory'] += memory
+        totals['length'] += length or 0
+        if ttl == -1:
+            totals['no_ttl'] += 1
+        record = (memory, key, key_type, ttl, length)
+        if len(self._biggest) < self.top:
+            heapq.heappush(self._biggest, record)
+        elif record > self._biggest[0]:
+            heapq.heapreplace(self._biggest, record)
+        if ttl == -1:
+            if len(self._no_ttl) < self.top:
+                heapq.heappush(self._no_ttl, record)
+            elif record > self._no_ttl[0]:
+                heapq.heapreplace(self._no_ttl, record)
+
+    @staticmethod
+    def _records(heap: list) -> list:
+        return [
+            {'key': key, 'type': key_type, 'memory': memory, 'ttl': ttl, 'length': length}
+            for memory, key, key_type, ttl, length in sorted(heap, reverse=True)
+        ]
+
+    def biggest(self) -> list:
+        """
+        内存占用最大的 top 个 key
+        """
+        return self._records(self._biggest)
+
+    def no_ttl(self) -> list:
+        """
+        没有设置过期时间的 key 中内存占用最大的 top 个
+        """
+        return self._records(self._no_ttl)
+
+    def pattern_rows(self) -> list:
+        return sorted(self.patterns.values(), key=lambda item: item['memory'], reverse=True)
+
+    def to_dict(self) -> dict:
+        return {
+            'keys': self.keys,
+            'memory': self.memory,
+            'started': self.started,
+            'elapsed': round(self.elapsed, 3),
+            'types': sorted(self.types.values(), key=lambda item: item['memory'], reverse=True),
+            'patterns': self.pattern_rows(),
+            'biggest': self.biggest(),
+            'no_ttl': self.no_ttl(),
+        }
+
+    def save(self, prefix='keyspace') -> None:
+        """
+        保存为 {prefix}_patterns.csv、{prefix}_biggest.csv、{prefix}_no_ttl.csv 及 {prefix}.json
+        """
+        save_csv(
+            [
+                [item['pattern'], item['keys'], item['memory'], item['no_ttl'], item['length'],
+                 ','.join(f'{key}={value}' for key, value in item['types'].items())]
+                for item in self.pattern_rows()
+            ],
+            f'{prefix}_patterns.csv', headers=['pattern', 'keys', 'memory', 'no_ttl', 'length', 'types'], atomic=True,
+        )
+        headers = ['key', 'type', 'memory', 'ttl', 'length']
+        for name, records in (('biggest', self.biggest()), ('no_ttl', self.no_ttl())):
+            save_csv(
+                [[record[header] for header in headers] for record in records],
+                f'{prefix}_{name}.csv', headers=headers, atomic=True,
+            )
+        save_json(self.to_dict(), f'{prefix}.json', ensure_ascii=False, atomic=True)
+
+
+async def _inspect(redis_client: RedisClient, keys: list, memory: bool, budget: OpsBudget) -> list:
+    """
+    以两个管道查询一批 key 的 (类型, 内存, ttl, 元素数量)
+    """
+    per_key = 3 if memory else 2
+    await budget.acquire(len(keys) * per_key)
+    async with await redis_client.pipeline() as pipe:
+        for key in keys:
+            await pipe.type(key)
+            await pipe.ttl(key)
+            if memory:
+                await pipe.execute_command('MEMORY USAGE', key)
+        results = await pipe.execute(raise_on_error=False)
+    items = []
+    for index in range(len(keys)):
+        values = results[index * per_key:(index + 1) * per_key]
+        key_type = _decode(values[0])
+        ttl = values[1] if isinstance(values[1], int) else None
+        usage = values[2] if memory and isinstance(values[2], int) else None
+        items.append([key_type, usage, ttl, None])
+
+    # key 在两次查询之间可能被删除，类型为 none 的 key 不再查询
+    targets = [(index, key) for index, key in enumerate(keys) if items[index][0] in _LENGTH_COMMANDS]
+    if targets:
+        await budget.acquire(len(targets))
+        async with await redis_client.pipeline() as pipe:
+            for index, key in targets:
+                await getattr(pipe, _LENGTH_COMMANDS[items[index][0]])(key)
+            lengths = await pipe.execute(raise_on_error=False)
+        for (index, _), length in zip(targets, lengths):
+            items[index][3] = length if isinstance(length, int) else None
+    return items
+
+
+async def analyze_keyspace(
+        redis_client: RedisClient, match='*', sample_size: int = None, count=1000, batch_size=100,
+        ops_per_second: float = None, memory=True, separator=':', depth=2, top=100,
+        progress: Optional[Progress] = None,
+) -> KeyspaceReport:
+    """
+    分析 keyspace
+
+    :param sample_size: 最多分析的 key 数量，None 表示遍历全部
+    :param count: SCAN 每次返回的数量提示
+    :param batch_size: 每个管道包含的 key 数量
+    :param ops_per_second: 每秒最多发送的命令数量（包括 SCAN），None 表示不限制
+    :param memory: 是否查询 MEMORY USAGE（需要 redis 4.0+）
+    :param separator: key 的分隔符
+    :param depth: 前缀模式保留的片段数量，参考 key_pattern
+    :param top: 最大 key 及无过期时间 key 的保留数量
+    """
+    budget = OpsBudget(ops_per_second)
+    report = KeyspaceReport(top=top)
+    progress = progress or Progress(f'keyspace:{match}')
+    started = time.monotonic()
+    cursor = 0
+    while True:
+        await budget.acquire(1)
+        cursor, keys = await redis_client.scan(cursor=cursor, match=match, count=count)
+        if sample_size is not None:
+            keys = keys[:sample_size - report.keys]
+        for start in range(0, len(keys), batch_size):
+            batch = keys[start:start + batch_size]
+            for key, (key_type, usage, ttl, length) in zip(batch, await _inspect(redis_client, batch, memory, budget)):
+                if key_type == 'none':
+                    continue
+                key = _decode(key)
+                report.add(key, key_type, usage, ttl, length, key_pattern(key, separator, depth))
+            progress.update(len(batch))
+        if not cursor or (sample_size is not None and report.keys >= sample_size):
+            break
+    report.elapsed = time.monotonic() - started
+    progress.report()
+    return report
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+import importlib
+import types
+
+
+class LazyModule(types.ModuleType):
+    """
+    延迟导入的模块，首次访问属性时才真正导入
+
+    导入后会把模块的属性复制到自身，之后的属性访问与普通模块一样没有额外开销
+    """
+
+    def __init__(self, name: str) -> None:
+        super().__init__(name)
+
+    def _load(self) -> types.ModuleType:
+        module = importlib.import_module(self.__name__)
+        self.__dict__.update(module.__dict__)
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __dir__(self) -> list:
+        return dir(self._load())
+
+
+def lazy_import(name: str) -> types.ModuleType:
+    """
+    延迟导入模块，用于 pandas、numpy、aredis 等导入较慢的依赖
+
+        pd = lazy_import('pandas')
+    """
+    return LazyModule(name)
@@ -1,10 +1,447 @@
 # -*- coding: utf-8 -*-
+import atexit
+import json
 import logging
+import os
+import queue
+import sys
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_FORMAT = "%(asctime)s | %(levelname)s | %(message)s"
+# 日志队列容量
+QUEUE_SIZE = 10000
+# 后台线程每次最多合并写出的日志条数
+BATCH_SIZE = 256
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    紧凑的 json 格式日志，每条日志一行
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        item = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            item['exc'] = record.exc_text
+        return json.dumps(item, ensure_ascii=False, separators=(',', ':'))
+
+
+class _BatchMixin:
+
+    def handle_batch(self, records: list) -> None:
+        """
+        将多条日志合并为一次写入和一次 flush
+        """
+        lines = []
+        for record in records:
+            if not self.filter(record):
+                continue
+            try:
+                lines.append(self.format(record))
+            except Exception:
+                self.handleError(record)
+        if not lines:
+            return
+        self.acquire()
+        try:
+            if self.stream is None:
+                self.stream = self._open()
+            self.stream.write(self.terminator.join(lines) + self.terminator)
+            self.flush()
+        except Exception:
+            self.handleError(records[-1])
+        finally:
+            self.release()
+
+
+class BatchStreamHandler(_BatchMixin, logging.StreamHandler):
+    pass
+
+
+class BatchFileHandler(_BatchMixin, logging.FileHandler):
+    pass
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    不阻塞调用方的队列 handler
+
+    :param policy:
+        drop: 队列满时丢弃新日志
+        sample: 队列超过 high_watermark 后，低于 WARNING 的日志只保留 1/sample_rate，队列满时丢弃
+    丢弃的数量记录在 dropped 中
+    """
+
+    def __init__(self, log_queue: queue.Queue, policy='sample', sample_rate=10, high_watermark=0.8) -> None:
+        super().__init__(log_queue)
+        self.policy = policy
+        self.sample_rate = sample_rate
+        self.high_watermark = int(log_queue.maxsize * high_watermark) if log_queue.maxsize > 0 else 0
+        self.dropped = 0
+        self._sampled = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # 只合并参数，时间等格式化工作留给后台线程
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        if self.policy == 'sample' and self.high_watermark and record.levelno < logging.WARNING \
+                and self.queue.qsize() >= self.high_watermark:
+            self._sampled += 1
+            if self._sampled % self.sample_rate:
+                self.dropped += 1
+                return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            self.enqueue(self.prepare(record))
+        except Exception:
+            self.handleError(record)
+
+
+class BatchQueueListener(QueueListener):
+    """
+    批量消费日志队列，每次最多取出 batch_size 条，交给支持 handle_batch 的 handler 一次写出
+    """
+
+    def __init__(self, log_queue: queue.Queue, *handlers, respect_handler_level=True, batch_size=BATCH_SIZE) -> None:
+        super().__init__(log_queue, *handlers, respect_handler_level=respect_handler_level)
+        self.batch_size = batch_size
+
+    def handle_batch(self, records: list) -> None:
+        for handler in self.handlers:
+            if self.respect_handler_level:
+                items = [record for record in records if record.levelno >= handler.level]
+            else:
+                items = records
+            if not items:
+                continue
+            if hasattr(handler, 'handle_batch'):
+                handler.handle_batch(items)
+            else:
+                for record in items:
+                    handler.handle(record)
+
+    def _monitor(self) -> None:
+        log_queue = self.queue
+        has_task_done = hasattr(log_queue, 'task_done')
+        while True:
+            records = [self.dequeue(True)]
+            while len(records) < self.batch_size:
+                try:
+                    records.append(self.dequeue(False))
+                except queue.Empty:
+                    break
+            stop = False
+            batch = []
+            for record in records:
+                if record is self._sentinel:
+                    stop = True
+                else:
+                    batch.append(record)
+                if has_task_done:
+                    log_queue.task_done()
+            if batch:
+                self.handle_batch(batch)
+            if stop:
+                break
+
+
+logger = logging.getLogger('methods')
+logger.setLevel(logging.INFO)
+
+_listener = None
+_setup_lock = threading.RLock()
+# 最近一次 setup_logging 的参数，fork 后的子进程按相同的参数重新配置
+_setup_kwargs = {}
+
+
+def setup_logging(
+        level=logging.INFO, fmt=LOG_FORMAT, json_format=False, stream=None, filename=None,
+        queue_size=QUEUE_SIZE, batch_size=BATCH_SIZE, policy='sample', sample_rate=10, force=False,
+) -> logging.Logger:
+    """
+    配置 methods 日志：调用方只把日志放入有界队列，由后台线程批量格式化并写出
+
+    首次输出日志时会以默认参数自动调用，如需自定义请在此之前调用，或指定 force=True 重新配置
+    :param json_format: 是否输出紧凑的 json 格式
+    :param stream: 输出流，默认 sys.stderr
+    :param filename: 指定时输出到文件
+    :param policy: 队列积压时的处理策略，参考 NonBlockingQueueHandler
+    """
+    global _listener, _setup_kwargs
+    with _setup_lock:
+        if _listener is not None:
+            if not force:
+                return logger
+            _listener.stop()
+            for handler in _listener.handlers:
+                handler.close()
+            _listener = None
+
+        if filename:
+            handler = BatchFileHandler(filename, encoding='utf-8')
+        else:
+            handler = BatchStreamHandler(stream or sys.stderr)
+        handler.setFormatter(JsonFormatter() if json_format else logging.Formatter(fmt))
+
+        _setup_kwargs = dict(
+            level=level, fmt=fmt, json_format=json_format, stream=stream, filename=filename, queue_size=queue_size,
+            batch_size=batch_size, policy=policy, sample_rate=sample_rate,
+        )
+        log_queue = queue.Queue(queue_size)
+        _listener = BatchQueueListener(log_queue, handler, batch_size=batch_size)
+        _listener.start()
+        # 替换为新的列表，避免正在遍历 handlers 的调用受影响
+        logger.handlers = [NonBlockingQueueHandler(log_queue, policy=policy, sample_rate=sample_rate)]
+        logger.setLevel(level)
+        logger.propagate = False
+    return logger
+
+
+@atexit.register
+def shutdown_logging() -> None:
+    """
+    写出队列中剩余的日志并停止后台线程
+    """
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            _listener.stop()
+            for handler in _listener.handlers:
+                handler.close()
+            _listener = None
+            logger.handlers = [_LazyHandler()]
+
+
+class _LazyHandler(logging.Handler):
+    """
+    首次输出日志时才完成配置
+    """
+
+    def emit(self, record: logging.LogRecord) -> None:
+        setup_logging(**_setup_kwargs)
+        for handler in logger.handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+
+def _reset_after_fork() -> None:
+    """
+    fork 出的子进程继承了队列但没有后台线程，丢弃继承的队列（其中是父进程的日志），首次输出日志时重新配置
+    """
+    global _listener, _setup_lock
+    _setup_lock = threading.RLock()
+    if _listener is not None:
+        _listener = None
+        logger.handlers = [_LazyHandler()]
+
+
+logger.addHandler(_LazyHandler())
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def get_logger(name: str = None) -> logging.Logger:
+    """
+    获取 methods 下的子 logger
+    """
+    if not name:
+        return logger
+    return logger.getChild(name)
+
+
+class Lazy:
+    """
+    延迟计算的日志参数，只有日志真正输出时才会调用 func
+
+        logger.debug('rows=%s', Lazy(len, rows))
+    """
+    __slots__ = ('func', 'args', 'kwargs')
+
+    def __init__(self, func, *args, **kwargs) -> None:
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+
+    def __str__(self) -> str:
+        return str(self.func(*self.args, **self.kwargs))
+
+    def __repr__(self) -> str:
+        return repr(self.func(*self.args, **self.kwargs))
+
+
+def _message_key(record: logging.LogRecord) -> tuple:
+    # 使用格式化前的模板作为 key，不需要格式化日志
+    return record.name, record.levelno, getattr(record, 'msg_template', record.msg)
+
+
+def _annotate(record: logging.LogRecord, text: str) -> None:
+    # 附加说明前保存原始模板，之后的过滤器仍按原始模板区分日志
+    if not hasattr(record, 'msg_template'):
+        record.msg_template = record.msg
+    record.msg = f'{record.msg} {text}'
+
+
+def _original_message(record: logging.LogRecord) -> str:
+    template = getattr(record, 'msg_template', None)
+    if template is None:
+        return record.getMessage()
+    message = str(template)
+    return message % record.args if record.args else message
+
+
+class EveryNFilter(logging.Filter):
+    """
+    同一条日志（按格式化前的模板区分）每 n 次只输出 1 次
+    """
+
+    def __init__(self, n: int, key=_message_key) -> None:
+        super().__init__()
+        self.n = n
+        self.key = key
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = self.key(record)
+        with self._lock:
+            count = self._counts.get(key, 0)
+            self._counts[key] = count + 1
+        if count % self.n:
+            return False
+        if count:
+            _annotate(record, f'[sampled 1/{self.n}, total {count + 1}]')
+        return True
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    按日志模板分别限流的令牌桶，每秒补充 rate 个令牌，最多积累 burst 个
+
+    被限流的日志数量会附加在下一条输出的同类日志后
+    """
+
+    def __init__(self, rate=1.0, burst=10, key=_message_key) -> None:
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self.key = key
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = self.key(record)
+        current = time.monotonic()
+        with self._lock:
+            tokens, updated, suppressed = self._buckets.get(key, (self.burst, current, 0))
+            tokens = min(self.burst, tokens + (current - updated) * self.rate)
+            if tokens < 1:
+                self._buckets[key] = (tokens, current, suppressed + 1)
+                return False
+            self._buckets[key] = (tokens - 1, current, 0)
+            if len(self._buckets) > 10000:
+                # 令牌已补满且没有被限流的日志时，删除与保留效果相同
+                self._buckets = {
+                    k: v for k, v in self._buckets.items()
+                    if v[2] or v[0] + (current - v[1]) * self.rate < self.burst
+                }
+        if suppressed:
+            _annotate(record, f'[suppressed {suppressed:,} similar messages]')
+        return True
+
+
+class DuplicateFilter(logging.Filter):
+    """
+    在 interval 秒内重复出现的相同日志只输出一次，之后再次输出时附带重复次数，如: repeated 10,000 times
+    """
+
+    def __init__(self, interval=60.0) -> None:
+        super().__init__()
+        self.interval = interval
+        self._seen = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(record: logging.LogRecord):
+        # 按模板和参数区分，不格式化日志，Lazy 参数只在输出时计算
+        key = (record.name, record.levelno, getattr(record, 'msg_template', record.msg), record.args)
+        try:
+            hash(key)
+            return key
+        except TypeError:
+            pass
+        # 参数不可哈希时按格式化后的内容区分，格式化失败的日志直接输出，由 handler 报告错误
+        try:
+            return record.name, record.levelno, _original_message(record)
+        except Exception:
+            return None
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = self._key(record)
+        if key is None:
+            return True
+        current = time.monotonic()
+        with self._lock:
+            first, repeated = self._seen.get(key, (None, 0))
+            if first is not None and current - first < self.interval:
+                self._seen[key] = (first, repeated + 1)
+                return False
+            self._seen[key] = (current, 0)
+            if len(self._seen) > 10000:
+                self._seen = {k: v for k, v in self._seen.items() if current - v[0] < self.interval}
+        if repeated:
+            try:
+                template, message = _original_message(record), record.getMessage()
+            except Exception:
+                return True
+            record.msg_template = template
+            record.msg = f'{message} [repeated {repeated:,} times in {current - first:.0f}s]'
+            record.args = None
+        return True
+
+
+def get_sampled_logger(
+        name: str, every_n: int = None, rate: float = None, burst=10, dedup_interval: float = None,
+) -> logging.Logger:
+    """
+    获取用于高频循环中的采样 logger（methods.sampled.<name>）
+
+    :param every_n: 同一模板的日志每 every_n 次输出 1 次
+    :param rate: 同一模板的日志每秒最多输出 rate 次（令牌桶，允许 burst 次突发）
+    :param dedup_interval: 相同内容的日志在该时间内只输出一次，之后汇总重复次数
+
+    日志级别未开启时不会执行任何格式化，参数请使用 %s 占位符或 Lazy 传入，而不是 f-string
+    """
+    sampled_logger = logger.getChild(f'sampled.{name}')
+    for item in list(sampled_logger.filters):
+        sampled_logger.removeFilter(item)
+    if every_n:
+        sampled_logger.addFilter(EveryNFilter(every_n))
+    if rate:
+        sampled_logger.addFilter(RateLimitFilter(rate, burst))
+    if dedup_interval:
+        sampled_logger.addFilter(DuplicateFilter(dedup_interval))
+    return sampled_logger
 
-logging.basicConfig(
-    level=logging.INFO, format="%(asctime)s | %(levelname)s | %(message)s"
-)
-logger = logging.getLogger()
 
 if __name__ == '__main__':
     logger.info('test logger')
@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+"""
+基于 HyperLogLog 和位图的概率数据结构
+
+UniqueCounter: 按天分 key 的 HyperLogLog 去重计数，每个 key 最多 12KB，标准误差约 0.81%
+DailyActive: 按天分 key 的活跃位图，以整数用户 id 为偏移量，1 亿用户每天约 12MB
+BloomFilter: 基于位图的布隆过滤器，多个哈希位通过一次管道批量设置和检查
+
+日期参数支持 datetime、date 及 date2int 格式（YYYYMMDD）的 int，默认为当天
+"""
+import hashlib
+import math
+import uuid
+from datetime import timedelta
+
+from methods.dt import date2int, int2date, now
+from methods.exceptions import MethodException
+from methods.redis import RedisClient
+
+# redis 字符串最大 512MB，即 2^32 位
+MAX_BITS = 2 ** 32
+
+
+def _day(day=None) -> int:
+    if day is None:
+        return date2int(now())
+    if isinstance(day, int):
+        return day
+    return date2int(day)
+
+
+def iter_days(start_day, end_day):
+    """
+    生成 [start_day, end_day] 内每一天的 YYYYMMDD
+    """
+    current, end = int2date(_day(start_day)), int2date(_day(end_day))
+    while current <= end:
+        yield date2int(current)
+        current += timedelta(days=1)
+
+
+class UniqueCounter:
+    """
+    按天去重计数，key 为 {prefix}{name}:{YYYYMMDD}
+    """
+
+    def __init__(self, redis_client: RedisClient, name: str, prefix='uv:', ttl: int = None) -> None:
+        self.redis_client = redis_client
+        self.name = name
+        self.prefix = prefix
+        self.ttl = ttl
+
+    def key(self, day=None) -> str:
+        return f'{self.prefix}{self.name}:{_day(day)}'
+
+    async def add(self, values: list, day=None) -> int:
+        """
+        添加元素，估计的基数发生变化时返回 1
+        """
+        if not values:
+            return 0
+        key = self.key(day)
+        if not self.ttl:
+            return await self.redis_client.pfadd(key, *values)
+        async with await self.redis_client.pipeline() as pipe:
+            await pipe.pfadd(key, *values)
+            await pipe.expire(key, self.ttl)
+            return (await pipe.execute())[0]
+
+    async def count(self, day=None) -> int:
+        return await self.redis_client.pfcount(self.key(day))
+
+    async def count_range(self, start_day, end_day) -> int:
+        """
+        [start_day, end_day] 内的去重总数，由服务端合并计算，不会修改已有的 key
+        """
+        return await self.redis_client.pfcount(*[self.key(day) for day in iter_days(start_day, end_day)])
+
+    async def merge(self, dest: str, start_day, end_day) -> bool:
+        """
+        将 [start_day, end_day] 内的计数合并保存到 dest，如按周、按月汇总
+        """
+        return await self.redis_client.pfmerge(dest, *[self.key(day) for day in iter_days(start_day, end_day)])
+
+
+class DailyActive:
+    """
+    按天的活跃位图，key 为 {prefix}{name}:{YYYYMMDD}，用户 id 需要为小于 2^32 的非负整数
+    """
+
+    def __init__(self, redis_client: RedisClient, name: str, prefix='dau:', ttl: int = None) -> None:
+        self.redis_client = redis_client
+        self.name = name
+        self.prefix = prefix
+        self.ttl = ttl
+
+    def key(self, day=None) -> str:
+        return f'{self.prefix}{self.name}:{_day(day)}'
+
+    async def mark(self, user_id: int, day=None) -> int:
+        """
+        标记用户在指定日期活跃，返回原来的状态
+        """
+        return (await self.mark_many([user_id], day))[0]
+
+    async def mark_many(self, user_ids: list, day=None) -> list:
+        """
+        通过一个管道批量标记用户活跃
+        """
+        key = self.key(day)
+        async with await self.redis_client.pipeline() as pipe:
+            for user_id in user_ids:
+                await pipe.setbit(key, user_id, 1)
+            if self.ttl:
+                await pipe.expire(key, self.ttl)
+            results = await pipe.execute()
+        return results[:len(user_ids)]
+
+    async def is_active(self, user_id: int, day=None) -> bool:
+        return bool(await self.redis_client.getbit(self.key(day), user_id))
+
+    async def count(self, day=None) -> int:
+        return await self.redis_client.bitcount(self.key(day))
+
+    async def _count_op(self, operation: str, days: list) -> int:
+        # 位运算结果写入临时 key，计数后删除，三条命令在一个管道中完成
+        dest = f'{self.prefix}{self.name}:tmp:{uuid.uuid4().hex}'
+        async with await self.redis_client.pipeline() as pipe:
+            await pipe.bitop(operation, dest, *[self.key(day) for day in days])
+            await pipe.bitcount(dest)
+            await pipe.delete(dest)
+            return (await pipe.execute())[1]
+
+    async def count_range(self, start_day, end_day) -> int:
+        """
+        [start_day, end_day] 内至少活跃一天的用户数
+        """
+        return await self._count_op('OR', list(iter_days(start_day, end_day)))
+
+    async def count_every_day(self, start_day, end_day) -> int:
+        """
+        [start_day, end_day] 内每天都活跃的用户数
+        """
+        return await self._count_op('AND', list(iter_days(start_day, end_day)))
+
+    async def retained(self, day, next_day) -> int:
+        """
+        在 day 与 next_day 都活跃的用户数
+        """
+        return await self._count_op('AND', [day, next_day])
+
+
+def bloom_parameters(capacity: int, error_rate: float) -> tuple:
+    """
+    根据预计元素数量和误判率计算 (位数, 哈希函数数量)
+    """
+    if capacity <= 0 or not 0 < error_rate < 1:
+        raise MethodException('capacity 必须大于 0，error_rate 必须在 (0, 1) 之间')
+    bits = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+    hashes = max(1, round(bits / capacity * math.log(2)))
+    if bits > MAX_BITS:
+        raise MethodException(f'布隆过滤器需要 {bits} 位，超过 redis 字符串上限，请降低容量或拆分为多个过滤器')
+    return bits, hashes
+
+
+class BloomFilter:
+    """
+    基于位图的布隆过滤器
+
+    使用 blake2b 的两个 64 位结果进行双重哈希，得到 hashes 个偏移量
+    :param capacity: 预计元素数量
+    :param error_rate: 达到 capacity 时的误判率
+    """
+
+    def __init__(
+            self, redis_client: RedisClient, name: str, capacity: int, error_rate=0.01, prefix='bloom:',
+    ) -> None:
+        self.redis_client = redis_client
+        self.key = f'{prefix}{name}'
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.bits, self.hashes = bloom_parameters(capacity, error_rate)
+
+    def offsets(self, item) -> list:
+        if isinstance(item, str):
+            item = item.encode('utf-8')
+        elif not isinstance(item, bytes):
+            item = str(item).encode('utf-8')
+        digest = hashlib.blake2b(item, digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.bits for i in range(self.hashes)]
+
+    async def add(self, item) -> bool:
+        """
+        添加元素，元素可能已经存在时返回 False
+        """
+        return (await self.add_many([item]))[0]
+
+    async def add_many(self, items: list) -> list:
+        """
+        通过一个管道批量添加元素
+        :return:
+            每个元素是否为新元素（存在误判）
+        """
+        async with await self.redis_client.pipeline() as pipe:
+            for item in items:
+                for offset in self.offsets(item):
+                    await pipe.setbit(self.key, offset, 1)
+            results = await pipe.execute()
+        return [
+            not all(results[index:index + self.hashes]) for index in range(0, len(results), self.hashes)
+        ]
+
+    async def contains(self, item) -> bool:
+        return (await self.contains_many([item]))[0]
+
+    async def contains_many(self, items: list) -> list:
+        """
+        通过一个管道批量检查元素，返回 False 时一定不存在，返回 True 时可能存在
+        """
+        async with await self.redis_client.pipeline() as pipe:
+            for item in items:
+                for offset in self.offsets(item):
+                    await pipe.getbit(self.key, offset)
+            results = await pipe.execute()
+        return [all(results[index:index + self.hashes]) for index in range(0, len(results), self.hashes)]
+
+    async def clear(self) -> int:
+        return await self.redis_client.delete(self.key)
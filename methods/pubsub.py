@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+"""
+基于单个 redis 连接的发布订阅分发
+
+Subscriber 只占用一个订阅连接，收到的消息按频道/模式分发给本地的多个异步处理函数，
+每个处理函数拥有独立的有界队列和消费任务，处理慢的函数不会阻塞其他函数及读取连接
+
+    subscriber = Subscriber(redis_client)
+    await subscriber.subscribe('news', on_news)
+    await subscriber.psubscribe('order:*', on_order)
+    await subscriber.start()
+    ...
+    await subscriber.stop()
+"""
+import asyncio
+import inspect
+from typing import Callable
+
+from methods.exceptions import MethodException
+from methods.logger import logger
+from methods.redis import RedisClient
+
+# 每个处理函数的队列容量
+QUEUE_SIZE = 1000
+# 重连等待时间（秒），失败后指数增长至 MAX_RECONNECT_DELAY
+RECONNECT_DELAY = 0.5
+MAX_RECONNECT_DELAY = 30.0
+
+_POLICIES = ('drop_oldest', 'drop_new')
+
+
+class Subscription:
+    """
+    单个处理函数的订阅
+
+    :param policy:
+        drop_oldest: 队列满时丢弃最早的消息
+        drop_new: 队列满时丢弃新消息
+    丢弃的数量记录在 dropped 中
+    """
+
+    def __init__(
+            self, subscriber, name: str, handler: Callable, pattern=False, queue_size=QUEUE_SIZE, policy='drop_oldest',
+    ) -> None:
+        if policy not in _POLICIES:
+            raise MethodException(f'不支持的策略: {policy}')
+        self.subscriber = subscriber
+        self.name = name
+        self.handler = handler
+        self.pattern = pattern
+        self.policy = policy
+        self.queue = asyncio.Queue(queue_size)
+        self.received = 0
+        self.dropped = 0
+        self.errors = 0
+        self._is_async = inspect.iscoroutinefunction(handler)
+        self._task = None
+
+    def put(self, message: dict) -> None:
+        self.received += 1
+        if self.queue.full():
+            self.dropped += 1
+            if self.policy == 'drop_new':
+                return
+            self.queue.get_nowait()
+            self.queue.task_done()
+        self.queue.put_nowait(message)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._consume())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _consume(self) -> None:
+        while True:
+            message = await self.queue.get()
+            try:
+                if self._is_async:
+                    await self.handler(message)
+                else:
+                    self.handler(message)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.errors += 1
+                logger.exception('pubsub handler failed: name=%s', self.name)
+            finally:
+                self.queue.task_done()
+
+    async def unsubscribe(self) -> None:
+        await self.subscriber.remove(self)
+
+    def to_dict(self) -> dict:
+        return {
+            'name': self.name,
+            'pattern': self.pattern,
+            'received': self.received,
+            'dropped': self.dropped,
+            'errors': self.errors,
+            'pending': self.queue.qsize(),
+        }
+
+
+class Subscriber:
+    """
+    共享一个订阅连接的消息分发器
+
+    连接断开后按指数退避重连，并重新订阅所有频道及模式
+    :param queue_size: 处理函数队列的默认容量
+    :param policy: 队列满时的默认处理策略，参考 Subscription
+    """
+
+    def __init__(
+            self, redis_client: RedisClient, queue_size=QUEUE_SIZE, policy='drop_oldest',
+            reconnect_delay=RECONNECT_DELAY, max_reconnect_delay=MAX_RECONNECT_DELAY,
+    ) -> None:
+        self.redis_client = redis_client
+        self.queue_size = queue_size
+        self.policy = policy
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.reconnects = 0
+        self._pubsub = None
+        self._channels = {}
+        self._patterns = {}
+        self._running = False
+        self._task = None
+        self._subscribed = None
+
+    @property
+    def pubsub(self):
+        if self._pubsub is None:
+            self._pubsub = self.redis_client.pubsub(ignore_subscribe_messages=True)
+        return self._pubsub
+
+    async def subscribe(self, channel: str, handler: Callable, queue_size=None, policy=None) -> Subscription:
+        """
+        订阅频道，handler(message) 可以是普通函数或协程函数
+        message 为字典: type, pattern, channel, data
+        """
+        return await self._add(channel, handler, False, queue_size, policy)
+
+    async def psubscribe(self, pattern: str, handler: Callable, queue_size=None, policy=None) -> Subscription:
+        """
+        按模式订阅频道，如 order:*
+        """
+        return await self._add(pattern, handler, True, queue_size, policy)
+
+    async def _add(self, name: str, handler: Callable, pattern: bool, queue_size, policy) -> Subscription:
+        registry = self._patterns if pattern else self._channels
+        key = self.pubsub.encode(name)
+        subscription = Subscription(
+            self, name, handler, pattern=pattern,
+            queue_size=queue_size or self.queue_size, policy=policy or self.policy,
+        )
+        handlers = registry.setdefault(key, [])
+        handlers.append(subscription)
+        if self._running:
+            subscription.start()
+        if len(handlers) == 1:
+            # 同一频道只向 redis 订阅一次
+            try:
+                if pattern:
+                    await self.pubsub.psubscribe(name)
+                else:
+                    await self.pubsub.subscribe(name)
+            except Exception as e:
+                # 连接异常时由读取任务重连后统一订阅
+                logger.warning('pubsub subscribe failed: name=%s\terror=%r', name, e)
+            self._wakeup()
+        return subscription
+
+    async def remove(self, subscription: Subscription) -> None:
+        """
+        取消单个处理函数的订阅，频道没有处理函数后向 redis 取消订阅
+        """
+        registry = self._patterns if subscription.pattern else self._channels
+        key = self.pubsub.encode(subscription.name)
+        handlers = registry.get(key, [])
+        if subscription in handlers:
+            handlers.remove(subscription)
+        await subscription.stop()
+        if handlers or key not in registry:
+            return
+        del registry[key]
+        try:
+            if subscription.pattern:
+                await self.pubsub.punsubscribe(subscription.name)
+            else:
+                await self.pubsub.unsubscribe(subscription.name)
+        except Exception as e:
+            logger.warning('pubsub unsubscribe failed: name=%s\terror=%r', subscription.name, e)
+
+    def subscriptions(self) -> list:
+        return [item for handlers in (*self._channels.values(), *self._patterns.values()) for item in handlers]
+
+    def stats(self) -> list:
+        return [item.to_dict() for item in self.subscriptions()]
+
+    def dispatch(self, message: dict) -> int:
+        """
+        将消息放入对应处理函数的队列，返回分发的处理函数数量
+        """
+        if message['type'] == 'pmessage':
+            handlers = self._patterns.get(message['pattern'], ())
+        elif message['type'] == 'message':
+            handlers = self._channels.get(message['channel'], ())
+        else:
+            return 0
+        for subscription in handlers:
+            subscription.put(message)
+        return len(handlers)
+
+    def _wakeup(self) -> None:
+        if self._subscribed is not None and (self._channels or self._patterns):
+            self._subscribed.set()
+
+    async def start(self) -> None:
+        """
+        启动读取任务及所有处理函数的消费任务
+        """
+        if self._running:
+            return
+        self._running = True
+        self._subscribed = asyncio.Event()
+        self._wakeup()
+        for subscription in self.subscriptions():
+            subscription.start()
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self) -> None:
+        """
+        停止读取，取消所有订阅并释放连接
+        """
+        self._running = False
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        for subscription in self.subscriptions():
+            await subscription.stop()
+        if self._pubsub is not None:
+            self._pubsub.reset()
+            self._pubsub = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        await self.stop()
+
+    async def _resubscribe(self) -> None:
+        self.pubsub.reset()
+        if self._channels:
+            await self.pubsub.subscribe(*self._channels)
+        if self._patterns:
+            await self.pubsub.psubscribe(*self._patterns)
+
+    async def _run(self) -> None:
+        delay = self.reconnect_delay
+        reconnecting = False
+        while self._running:
+            if not (self._channels or self._patterns):
+                self._subscribed.clear()
+                await self._subscribed.wait()
+                continue
+            try:
+                if reconnecting or not self.pubsub.subscribed:
+                    await self._resubscribe()
+                    self.reconnects += 1
+                    reconnecting = False
+                    logger.info(
+                        'pubsub resubscribed: channels=%d\tpatterns=%d', len(self._channels), len(self._patterns)
+                    )
+                message = await self.pubsub.listen()
+                delay = self.reconnect_delay
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if not self._running:
+                    break
+                logger.warning('pubsub connection lost, retry in %.1fs: %r', delay, e)
+                reconnecting = True
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.max_reconnect_delay)
+                continue
+            if message is not None:
+                self.dispatch(message)
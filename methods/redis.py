@@ -1,7 +1,9 @@
 # -*- coding: utf-8 -*-
 from typing import Optional, Any
 
-from aredis import StrictRedis
+from methods.lazy import lazy_import
+
+aredis = lazy_import('aredis')
 
 
 class StringMixin:
@@ -748,13 +750,110 @@ class StreamMixin:
         return record[0]
 
 
-class RedisClient(StringMixin, ListMixin, SetMixin, HashMixin, ZSetMixin, StreamMixin):
+class HyperLogLogMixin:
+
+    async def pfadd(self, name: str, *values) -> int:
+        """
+        将元素添加到 HyperLogLog 中
+        :return:
+            估计的基数发生变化时返回 1，否则返回 0
+        """
+        return await self.redis_client.pfadd(name, *values)
+
+    async def pfcount(self, *sources) -> int:
+        """
+        返回给定 HyperLogLog 的基数估算值，指定多个 key 时返回并集的基数估算值
+
+        标准误差约为 0.81%，每个 key 最多占用 12KB 内存
+        """
+        return await self.redis_client.pfcount(*sources)
+
+    async def pfmerge(self, dest: str, *sources) -> bool:
+        """
+        将多个 HyperLogLog 合并为一个
+        """
+        return await self.redis_client.pfmerge(dest, *sources)
+
+
+class BitmapMixin:
+
+    async def setbit(self, name: str, offset: int, value: int) -> int:
+        """
+        设置或清除指定偏移量上的位
+        :return:
+            指定偏移量原来储存的位
+        """
+        return await self.redis_client.setbit(name, offset, value)
+
+    async def getbit(self, name: str, offset: int) -> int:
+        """
+        获取指定偏移量上的位
+        """
+        return await self.redis_client.getbit(name, offset)
+
+    async def bitcount(self, key: str, start=None, end=None) -> int:
+        """
+        计算被设置为 1 的位的数量，start、end 为字节下标
+        """
+        return await self.redis_client.bitcount(key, start=start, end=end)
+
+    async def bitop(self, operation: str, dest: str, *keys) -> int:
+        """
+        对一个或多个 key 进行位运算，并将结果保存到 dest
+        :param operation: AND、OR、XOR、NOT
+        :return:
+            保存到 dest 的字符串的长度
+        """
+        return await self.redis_client.bitop(operation, dest, *keys)
+
+    async def bitpos(self, key: str, bit: int, start=None, end=None) -> int:
+        """
+        返回第一个被设置为 bit 的位的偏移量
+        """
+        return await self.redis_client.bitpos(key, bit, start=start, end=end)
+
+
+class PubSubMixin:
+
+    async def publish(self, channel: str, message: str) -> int:
+        """
+        将信息发送到指定的频道
+        :return:
+            接收到信息的订阅者数量
+        """
+        return await self.redis_client.publish(channel, message)
+
+    def pubsub(self, ignore_subscribe_messages=True):
+        """
+        创建订阅对象，每个订阅对象独占一个连接
+
+        需要多个处理函数共享一个连接时请使用 methods.pubsub.Subscriber
+        """
+        return self.redis_client.pubsub(ignore_subscribe_messages=ignore_subscribe_messages)
+
+    async def pubsub_channels(self, pattern='*') -> list:
+        """
+        列出当前的活跃频道
+        """
+        return await self.redis_client.pubsub_channels(pattern)
+
+    async def pubsub_numsub(self, *channels) -> list:
+        """
+        返回给定频道的订阅者数量
+        """
+        return await self.redis_client.pubsub_numsub(*channels)
+
+
+class RedisClient(
+        StringMixin, ListMixin, SetMixin, HashMixin, ZSetMixin, StreamMixin,
+        HyperLogLogMixin, BitmapMixin, PubSubMixin,
+):
     """
     website http://www.redis.cn/commands.html
     """
 
     def __init__(self, host='127.0.0.1', port=6379, db=0) -> None:
-        self.redis_client = StrictRedis(host=host, port=port, db=db)
+        self.redis_client = aredis.StrictRedis(host=host, port=port, db=db)
 
     async def flushdb(self) -> bool:
         """
@@ -779,3 +878,30 @@ class RedisClient(StringMixin, ListMixin, SetMixin, HashMixin, ZSetMixin, Stream
         key 存在时删除 key
         """
         return await self.redis_client.delete(key)
+
+    async def type(self, name: str) -> bytes:
+        """
+        返回 key 所储存的值的类型
+        :return:
+            none、string、list、set、zset、hash、stream
+        """
+        return await self.redis_client.type(name)
+
+    async def scan(self, cursor=0, match=None, count=None) -> tuple:
+        """
+        迭代数据库中的 key，不会像 keys 一样阻塞服务端
+        :return:
+            (下一次迭代的游标, key 列表)，游标为 0 时表示迭代结束
+        """
+        return await self.redis_client.scan(cursor=cursor, match=match, count=count)
+
+    async def pipeline(self, transaction=False):
+        """
+        创建管道，批量发送命令以减少网络往返
+
+            async with await redis_client.pipeline() as pipe:
+                await pipe.set('a', 1)
+                await pipe.get('a')
+                res = await pipe.execute()
+        """
+        return await self.redis_client.pipeline(transaction=transaction)
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+from methods.benchmark import compare, run
+
+
+def test_run():
+    result = run(sizes=[100], repeat=2, name_filter='dt.')
+    names = {item['name'] for item in result['results']}
+    assert {'dt.weekday_in_interval', 'dt.np_date2int', 'dt.day_in_year'} <= names
+    for item in result['results']:
+        assert item['size'] == 100 and item['min_ms'] <= item['median_ms'] and item['peak_bytes'] >= 0
+    assert result['meta']['python']
+
+
+def test_compare():
+    baseline = {'results': [{'name': 'a', 'size': 10, 'min_ms': 1.0, 'peak_bytes': 100}]}
+    current = {'results': [
+        {'name': 'a', 'size': 10, 'min_ms': 1.5, 'peak_bytes': 100},
+        {'name': 'b', 'size': 10, 'min_ms': 1.0, 'peak_bytes': 100},
+    ]}
+    rows = compare(current, baseline, threshold=0.2)
+    assert [(row['metric'], row['status']) for row in rows] == [('min_ms', 'regression'), ('peak_bytes', 'ok')]
+
+
+if __name__ == '__main__':
+    test_run()
+    test_compare()
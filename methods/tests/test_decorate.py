@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+import asyncio
+
+from methods.decorate import cached, disable_profile, enable_profile, get_stats, profile, reset_stats
+
+
+@profile
+def sync_func(x):
+    return x * 2
+
+
+@profile(name='async_func')
+async def async_func(x):
+    await asyncio.sleep(0)
+    return x * 2
+
+
+def test_profile():
+    reset_stats()
+    assert [sync_func(i) for i in range(10)] == [i * 2 for i in range(10)]
+    assert asyncio.run(async_func(3)) == 6
+    assert get_stats(sync_func.__qualname__)['count'] == 10
+    assert get_stats('async_func')['count'] == 1
+    disable_profile()
+    sync_func(1)
+    enable_profile()
+    assert get_stats(sync_func.__qualname__)['count'] == 10
+    print(get_stats())
+
+
+def test_cached():
+    calls = []
+
+    @cached(maxsize=2)
+    def square(x):
+        calls.append(x)
+        return x * x
+
+    assert [square(1), square(1), square(2), square(3), square(1)] == [1, 1, 4, 9, 1]
+    assert calls == [1, 2, 3, 1]
+
+
+def test_async_cached():
+    calls = []
+
+    @cached(ttl=60)
+    async def load(x):
+        calls.append(x)
+        await asyncio.sleep(0.01)
+        return x * 2
+
+    async def main():
+        results = await asyncio.gather(*[load(1) for _ in range(1000)])
+        assert set(results) == {2}
+        assert await load(1) == 2
+
+    asyncio.run(main())
+    assert calls == [1]
+
+
+if __name__ == '__main__':
+    test_profile()
+    test_cached()
+    test_async_cached()
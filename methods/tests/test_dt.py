@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+from datetime import date, datetime, timedelta
+
+from methods.dt import (
+    Calendar,
+    date2int,
+    date2str,
+    day_in_year,
+    int2date,
+    iter_windows,
+    np_bucket,
+    partition_windows,
+    localize,
+    now,
+    np_timestamp2str,
+    Stopwatch,
+    timestamp,
+    today2str,
+    np_int2date,
+    np_str2int,
+    np_timestamp2int,
+    np_timestamp,
+    str2date,
+    np_date2int,
+    np_date2str,
+    np_day_in_year,
+    np_quarter,
+    np_weekday,
+    np_weekday_in_interval,
+    quarter,
+    quarter_end_date,
+    week_in_year,
+    weekday,
+    weekday_in_interval,
+)
+from methods.exceptions import MethodException
+
+DATES = [datetime(1969, 12, 31), datetime(2000, 2, 29), datetime(2021, 10, 1), datetime(2024, 12, 31, 23, 59)]
+
+
+def test_quarter():
+    assert [quarter(datetime(2021, month, 1)) for month in range(1, 13)] == [1, 1, 1, 2, 2, 2, 3, 3, 3, 4, 4, 4]
+
+
+def test_vectorized():
+    assert np_date2int(DATES).tolist() == [date2int(dt) for dt in DATES]
+    assert np_weekday(DATES).tolist() == [weekday(dt) for dt in DATES]
+    assert np_quarter(DATES).tolist() == [quarter(dt) for dt in DATES]
+    assert np_day_in_year(DATES).tolist() == [day_in_year(dt) for dt in DATES]
+    for str_format in ('%Y-%m-%d', '%Y%m%d', '%Y-%m-%d %H:%M:%S', '%Y/%m/%d'):
+        assert np_date2str(DATES, str_format).tolist() == [date2str(dt, str_format) for dt in DATES]
+    print(np_date2int(DATES))
+
+
+def test_weekday_in_interval():
+    start_date, end_date = datetime(2021, 10, 1), datetime(2021, 12, 29)
+    for day in range(1, 8):
+        expected = [
+            (start_date + timedelta(days=i)).strftime('%Y%m%d')
+            for i in range((end_date - start_date).days + 1)
+            if weekday(start_date + timedelta(days=i)) == day
+        ]
+        assert weekday_in_interval(day, start_date, end_date) == expected
+        assert np_date2str(np_weekday_in_interval(day, start_date, end_date), '%Y%m%d').tolist() == expected
+    print(weekday_in_interval(5, start_date, end_date, case_func=datetime))
+    for day in (0, 8):
+        for func in (weekday_in_interval, np_weekday_in_interval):
+            try:
+                func(day, start_date, end_date)
+            except MethodException:
+                pass
+            else:
+                raise AssertionError(day)
+
+
+def test_calendar():
+    cal = Calendar(2020, 2022, holidays=[20211001, 20211004])
+    dt = datetime(2020, 1, 1)
+    while dt.year <= 2022:
+        assert cal.weekday(dt) == weekday(dt)
+        assert cal.week_in_year(date2int(dt)) == week_in_year(dt)
+        assert cal.day_in_year(dt) == day_in_year(dt)
+        assert cal.quarter_end_date(dt) == date2int(quarter_end_date(dt))
+        dt += timedelta(days=1)
+    assert cal.next_business_day(20210930) == 20211005
+    assert cal.prev_business_day(20211005) == 20210930
+    assert cal.business_days_between(20211001, 20211101) == 19
+    print(cal.weekday([20211001, 20211002]))
+    for value in (20210231, 20210100, 20200230, [20211001, 20211032]):
+        try:
+            cal.weekday(value)
+        except MethodException:
+            pass
+        else:
+            raise AssertionError(value)
+    assert cal.weekday(20200229) == weekday(datetime(2020, 2, 29))
+
+
+def test_parse_format():
+    for str_format in ('%Y-%m-%d', '%Y%m%d', '%Y-%m-%d %H:%M:%S', '%d/%m/%Y'):
+        for dt in DATES:
+            value = dt.strftime(str_format)
+            assert date2str(dt, str_format) == value
+            assert str2date(value, str_format) == datetime.strptime(value, str_format)
+        values = [dt.strftime(str_format) for dt in DATES]
+        assert np_str2int(values, str_format).tolist() == [date2int(dt) for dt in DATES]
+    # date 没有时间部分，与 strftime 一样按 0 点格式化
+    assert today2str('%Y-%m-%d %H:%M:%S') == date.today().strftime('%Y-%m-%d 00:00:00')
+    # 包含时间格式符的格式不能使用按日期缓存的结果
+    dt = datetime(2021, 1, 2, 13, 45, 7)
+    for str_format in ('%T', '%R', '%-H:%-M', '%Y%m%d %I%p'):
+        assert date2str(dt, str_format) == dt.strftime(str_format)
+    for value, str_format in (
+            ('2021/10/01 07:30:00', '%Y-%m-%d %H:%M:%S'), ('2021/10/01', '%Y-%m-%d'), ('20211001', '%Y-%m-%d'),
+    ):
+        for func in (str2date, np_str2int):
+            try:
+                func(value if func is str2date else [value], str_format)
+            except ValueError:
+                pass
+            else:
+                raise AssertionError(value)
+    ints = [date2int(dt) for dt in DATES]
+    assert [int2date(value) for value in ints] == [datetime(dt.year, dt.month, dt.day) for dt in DATES]
+    assert np_date2int(np_int2date(ints)).tolist() == ints
+    assert np_timestamp2int(np_timestamp(DATES)).tolist() == ints
+
+
+def test_timezone():
+    assert now('Asia/Shanghai').utcoffset() == timedelta(hours=8)
+    dt = localize(datetime(2021, 10, 1, 7, 30), 'Asia/Shanghai')
+    assert np_timestamp([datetime(2021, 10, 1, 7, 30)], tz='Asia/Shanghai').tolist() == [timestamp(dt)]
+    values = np_timestamp2str([timestamp(dt)], '%Y-%m-%d %H:%M:%S', tz='Asia/Shanghai')
+    assert values.tolist() == ['2021-10-01 07:30:00']
+    assert np_timestamp2int([timestamp(dt)], tz='UTC').tolist() == [20210930]
+    # 不带时区的时间与 timestamp 一致，按本地时间处理
+    naive = datetime(2021, 10, 1, 12)
+    assert np_timestamp([naive]).tolist() == [timestamp(naive)]
+    assert np_timestamp2int([timestamp(naive)]).tolist() == [20211001]
+    assert np_timestamp2str([timestamp(naive)], '%Y-%m-%d %H').tolist() == ['2021-10-01 12']
+    # 带时区的输入取所在时区的日期，时间戳使用自身的时区
+    import pandas as pd
+    aware = localize(datetime(2021, 1, 1, 0, 30), 'Asia/Shanghai')
+    for values in ([aware], pd.Series([aware]), pd.DatetimeIndex([aware])):
+        assert np_date2int(values).tolist() == [date2int(aware)] == [20210101]
+        assert np_timestamp(values).tolist() == [timestamp(aware)]
+    # 夏令时切换附近与 datetime.timestamp（fold=0）一致：不存在的时间按切换前的偏移量，有歧义的时间取第一次出现
+    from zoneinfo import ZoneInfo
+    new_york = ZoneInfo('America/New_York')
+    values = [datetime(2021, 3, 14, 2, 30), datetime(2021, 11, 7, 1, 30), datetime(2021, 6, 1, 12)]
+    expected = [timestamp(value.replace(tzinfo=new_york)) for value in values]
+    assert np_timestamp(values, tz='America/New_York').tolist() == expected
+    with Stopwatch() as sw:
+        pass
+    assert sw.elapsed_ns >= 0
+
+
+def test_windows():
+    start_date, end_date = datetime(2021, 2, 15, 10), datetime(2022, 3, 1)
+    for unit in ('hour', 'day', 'week', 'month', 'quarter', 'year'):
+        windows = list(iter_windows(start_date, end_date, unit))
+        assert windows[0][0] <= start_date < windows[0][1] and windows[-1][0] < end_date <= windows[-1][1]
+        assert all(prev[1] == item[0] for prev, item in zip(windows, windows[1:]))
+        buckets = np_bucket([item[0] for item in windows], start_date, unit)
+        assert buckets.tolist() == list(range(len(windows)))
+    assert [item[0].month for item in iter_windows(start_date, end_date, 'quarter')] == [1, 4, 7, 10, 1]
+    partitions = partition_windows(iter_windows(start_date, end_date, 'day'), 4)
+    assert sum(len(item) for item in partitions) == 379
+    print([len(item) for item in partitions])
+
+
+if __name__ == '__main__':
+    test_quarter()
+    test_vectorized()
+    test_weekday_in_interval()
+    test_calendar()
+    test_parse_format()
+    test_timezone()
+    test_windows()
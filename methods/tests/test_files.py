@@ -8,9 +8,17 @@ from methods.files import (
     read_json,
     save_json,
     read_txt,
-    save_txt
+    save_txt,
+    detect_compression,
+    open_file,
+    iter_txt,
+    AtomicFile,
+    BatchWriter,
+    evict_parse_cache,
 )
 
+from methods.afiles import _aiter_chunks, aread_txt, asave_txt, aread_json, asave_json
+
 
 def test_txt():
     save_txt('save txt')
@@ -27,7 +35,148 @@ def test_csv():
     print(read_csv('template.csv'))
 
 
+def test_compressed():
+    for filename in ('template.txt.gz', 'template.txt.bz2', 'template.txt.xz'):
+        save_txt(['a', 'b'], filename=filename)
+        print(detect_compression(filename), read_txt(filename))
+        assert read_txt(filename) == ['a', 'b']
+    save_json({'test': 'json'}, filename='template.json.gz')
+    assert read_json('template.json.gz') == {'test': 'json'}
+    save_csv([['a', 'b']], filename='template.csv.bz2', headers=['x', 'y'])
+    assert read_csv('template.csv.bz2') == [['x', 'y'], ['a', 'b']]
+
+
+def test_atomic():
+    save_txt(['old'], filename='template.txt')
+    try:
+        with open_file('template.txt', 'w', atomic=True) as fw:
+            fw.write('new\n')
+            raise RuntimeError
+    except RuntimeError:
+        pass
+    assert read_txt('template.txt') == ['old']
+    save_txt(['new'], filename='template.txt', atomic=True)
+    assert read_txt('template.txt') == ['new']
+    with AtomicFile('template.txt.gz', 'w') as fw:
+        fw.write('gzip\n')
+    with open('template.txt.gz', 'rb') as fr:
+        assert fr.read(2) == b'\x1f\x8b'
+    assert read_txt('template.txt.gz') == ['gzip']
+
+
+def test_batch_writer():
+    save_txt([], filename='template.txt')
+    with BatchWriter('template.txt', batch_size=10) as writer:
+        for i in range(25):
+            writer.write(f'line {i}')
+    assert len(read_txt('template.txt')) == 25
+
+    # 空闲时未满一批的数据在 flush_interval 后写入
+    import time
+    writer = BatchWriter('template.txt', batch_size=1000, flush_interval=0.05)
+    writer.write('idle')
+    assert len(read_txt('template.txt')) == 25
+    time.sleep(0.2)
+    assert read_txt('template.txt')[-1] == 'idle'
+    writer.close()
+
+
+def test_async():
+    import asyncio
+    import time
+
+    async def main():
+        await asave_txt([f'line {i}' for i in range(10)], filename='template.txt', chunk_size=3)
+        print(await aread_txt('template.txt', chunk_size=4))
+        assert len(await aread_txt('template.txt', chunk_size=4)) == 10
+        await asave_json({'test': 'json'})
+        assert await aread_json('template.json') == {'test': 'json'}
+
+        # 读取过程中取消，等待磁盘线程中的读取结束后再关闭文件
+        iterator = iter_txt('template.txt')
+        closed = []
+
+        def slow_lines():
+            try:
+                for line in iterator:
+                    time.sleep(0.01)
+                    yield line
+            finally:
+                iterator.close()
+                closed.append(True)
+
+        async def consume():
+            return [line async for line in _aiter_chunks(slow_lines(), 10)]
+
+        task = asyncio.ensure_future(consume())
+        await asyncio.sleep(0.02)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        else:
+            raise AssertionError('not cancelled')
+        assert closed == [True]
+
+    asyncio.run(main())
+
+
+def test_parse_cache(tmp_path=None):
+    import os
+    import sys
+    import tempfile
+    import time
+
+    import pandas as pd
+
+    cache_dir = str(tmp_path) if tmp_path else tempfile.mkdtemp()
+    filename = os.path.join(cache_dir, 'data.csv')
+    cache_path = os.path.join(cache_dir, 'cache')
+    pd.DataFrame({'a': range(10), 'b': [i * 0.5 for i in range(10)]}).to_csv(filename, index=False)
+
+    # 未命中：读取后写入缓存
+    df = pd_read_csv(filename, cache=True, cache_dir=cache_path)
+    assert len(os.listdir(cache_path)) == 1
+    # 命中：结果与原始读取一致且可以修改
+    cached = pd_read_csv(filename, cache=True, cache_dir=cache_path)
+    assert cached.equals(df)
+    cached.loc[0, 'a'] = 5
+    assert pd_read_csv(filename, cache=True, cache_dir=cache_path).loc[0, 'a'] == 0
+
+    # 修改文件后缓存失效
+    time.sleep(0.01)
+    pd.DataFrame({'a': range(5), 'b': range(5)}).to_csv(filename, index=False)
+    assert len(pd_read_csv(filename, cache=True, cache_dir=cache_path)) == 5
+    assert len(os.listdir(cache_path)) == 2
+
+    # 未安装 pyarrow 时的 npy 缓存同样可以修改
+    npy_cache = os.path.join(cache_dir, 'npy_cache')
+    pyarrow, sys.modules['pyarrow'] = sys.modules.get('pyarrow'), None
+    try:
+        pd_read_csv(filename, cache=True, cache_dir=npy_cache)
+        assert any(name.endswith('.npy') for name in os.listdir(npy_cache))
+        cached = pd_read_csv(filename, cache=True, cache_dir=npy_cache)
+        cached.loc[0, 'a'] = 5
+        assert pd_read_csv(filename, cache=True, cache_dir=npy_cache).loc[0, 'a'] == 0
+    finally:
+        if pyarrow is None:
+            del sys.modules['pyarrow']
+        else:
+            sys.modules['pyarrow'] = pyarrow
+
+    # 缓存目录中的其他文件不会被删除
+    save_txt('keep', os.path.join(cache_path, 'keep.txt'))
+    assert evict_parse_cache(cache_path, max_size=0) == 2
+    assert os.listdir(cache_path) == ['keep.txt']
+
+
 if __name__ == '__main__':
     test_txt()
     test_json()
     test_csv()
+    test_compressed()
+    test_atomic()
+    test_batch_writer()
+    test_async()
+    test_parse_cache()
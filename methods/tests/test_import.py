@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+import os
+import subprocess
+import sys
+
+# 导入 methods 各模块的耗时上限（毫秒），可通过环境变量调整
+IMPORT_TIME_BUDGET_MS = float(os.environ.get('METHODS_IMPORT_TIME_BUDGET_MS', 150))
+
+HEAVY_MODULES = ('pandas', 'numpy', 'aredis', 'pytz')
+
+SCRIPT = f"""
+import sys
+import time
+start = time.perf_counter()
+import methods
+import methods.afiles, methods.blob, methods.bridge, methods.decorate, methods.dt, methods.files, methods.keyspace
+import methods.logger, methods.probabilistic, methods.pubsub, methods.redis, methods.timeseries, methods.writebehind
+elapsed = (time.perf_counter() - start) * 1000
+print(elapsed)
+print(','.join(name for name in {HEAVY_MODULES!r} if name in sys.modules))
+"""
+
+
+def _run(script: str) -> list:
+    cwd = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    output = subprocess.run([sys.executable, '-c', script], cwd=cwd, capture_output=True, text=True, check=True)
+    return output.stdout.splitlines()
+
+
+def test_import_time():
+    elapsed, loaded = _run(SCRIPT)
+    print(f'import methods: {float(elapsed):.1f}ms')
+    assert loaded == '', f'导入时加载了 {loaded}'
+    assert float(elapsed) < IMPORT_TIME_BUDGET_MS
+
+
+def test_lazy_api():
+    lines = _run(
+        'import inspect, methods, methods.files\n'
+        'print(methods.read_json is methods.files.read_json)\n'
+        # 顶层名称不能与子模块重名，否则永远返回子模块
+        'print(",".join(name for name in methods._ATTRIBUTES if inspect.ismodule(getattr(methods, name))))'
+    )
+    assert lines == ['True', '']
+
+
+if __name__ == '__main__':
+    test_import_time()
+    test_lazy_api()
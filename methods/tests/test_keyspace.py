@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import time
+
+from methods.files import read_csv, read_json
+from methods.keyspace import KeyspaceReport, OpsBudget, key_pattern
+
+
+def test_key_pattern():
+    assert key_pattern('user:123:profile', depth=3) == 'user:*:profile'
+    assert key_pattern('order:20210101:1') == 'order:*:*'
+    assert key_pattern('session:9f8e7d6c5b4a39281706f5e4d3c2b1a0') == 'session:*'
+    assert key_pattern('config') == 'config'
+
+
+def test_ops_budget():
+    async def main():
+        budget = OpsBudget(ops_per_second=1000, burst=100)
+        start = time.monotonic()
+        for _ in range(3):
+            await budget.acquire(100)
+        return time.monotonic() - start
+
+    elapsed = asyncio.run(main())
+    assert 0.15 <= elapsed < 1.0
+    print(elapsed)
+
+
+def test_report():
+    report = KeyspaceReport(top=2)
+    report.add('user:1', 'hash', 100, -1, 3, 'user:*')
+    report.add('user:2', 'hash', 300, 60, 5, 'user:*')
+    report.add('cache:a', 'string', 200, -1, 10, 'cache:*')
+    assert report.keys == 3 and report.memory == 600
+    assert [item['key'] for item in report.biggest()] == ['user:2', 'cache:a']
+    assert [item['key'] for item in report.no_ttl()] == ['cache:a', 'user:1']
+    assert report.patterns['user:*']['no_ttl'] == 1
+    report.save('template_keyspace')
+    assert read_csv('template_keyspace_patterns.csv')[1][0] == 'user:*'
+    assert read_json('template_keyspace.json')['types'][0]['type'] == 'hash'
+
+
+if __name__ == '__main__':
+    test_key_pattern()
+    test_ops_budget()
+    test_report()
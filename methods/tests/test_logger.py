@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+import io
+import json
+import os
+import tempfile
+import time
+
+from methods.logger import get_sampled_logger, Lazy, logger, setup_logging, shutdown_logging
+
+
+def test_queue_logging():
+    stream = io.StringIO()
+    setup_logging(stream=stream, json_format=True, force=True)
+    logger.info('hello %s', 'world')
+    shutdown_logging()
+    item = json.loads(stream.getvalue().splitlines()[0])
+    assert item['message'] == 'hello world'
+    print(item)
+
+
+def test_sampled_logging():
+    stream = io.StringIO()
+    setup_logging(stream=stream, force=True)
+    calls = []
+    every_n = get_sampled_logger('every_n', every_n=100)
+    combined = get_sampled_logger('combined', every_n=10, rate=0.001, burst=1)
+    limited = get_sampled_logger('limited', rate=10, burst=2)
+    dedup = get_sampled_logger('dedup', dedup_interval=0.05)
+    for i in range(1000):
+        every_n.info('row %d', i)
+        every_n.debug('skipped %s', Lazy(calls.append, i))
+        # 采样附加的说明不影响限流按原始模板区分
+        combined.info('combined %d', i)
+    for i in range(10):
+        limited.info('limited %d', i)
+    time.sleep(0.15)
+    limited.info('limited %d', 10)
+    for _ in range(5):
+        dedup.info('same %s', 'value')
+    time.sleep(0.06)
+    dedup.info('same %s', 'value')
+    shutdown_logging()
+    lines = stream.getvalue().splitlines()
+    assert len([line for line in lines if 'row' in line]) == 10
+    assert calls == []
+    assert len([line for line in lines if 'combined' in line]) == 1
+    limited_lines = [line for line in lines if 'limited' in line]
+    assert len(limited_lines) == 3 and 'suppressed 8 similar messages' in limited_lines[-1]
+    dedup_lines = [line for line in lines if 'same value' in line]
+    assert len(dedup_lines) == 2 and 'repeated 4 times' in dedup_lines[-1]
+    print(lines[:3])
+
+
+def test_duplicate_filter():
+    stream = io.StringIO()
+    setup_logging(stream=stream, force=True)
+    dedup = get_sampled_logger('dedup_args', dedup_interval=60)
+    calls = []
+    lazy = Lazy(lambda: calls.append(1) or 'lazy')
+    for _ in range(5):
+        # 被去重的日志不计算 Lazy 参数
+        dedup.info('value %s', lazy)
+        # 格式错误不会在调用处抛出
+        dedup.info('bad %d', 'x')
+        # 不可哈希的参数按格式化后的内容去重
+        dedup.info('items %s', [1, 2])
+    shutdown_logging()
+    lines = stream.getvalue().splitlines()
+    assert calls == [1]
+    assert len([line for line in lines if 'value lazy' in line]) == 1
+    assert len([line for line in lines if 'items [1, 2]' in line]) == 1
+
+
+def test_fork():
+    if not hasattr(os, 'fork'):
+        return
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filename = os.path.join(tmpdir, 'fork.log')
+        setup_logging(filename=filename, json_format=True, force=True)
+        logger.info('parent')
+        pid = os.fork()
+        if pid == 0:
+            # 子进程没有继承后台线程，需要重新配置后才能输出
+            logger.info('child')
+            shutdown_logging()
+            os._exit(0)
+        os.waitpid(pid, 0)
+        shutdown_logging()
+        with open(filename, encoding='utf-8') as fr:
+            messages = sorted(json.loads(line)['message'] for line in fr)
+    assert messages == ['child', 'parent']
+
+
+if __name__ == '__main__':
+    test_queue_logging()
+    test_sampled_logging()
+    test_duplicate_filter()
+    test_fork()
@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+from methods.probabilistic import BloomFilter, bloom_parameters, iter_days
+
+
+def test_bloom_parameters():
+    bits, hashes = bloom_parameters(1000000, 0.01)
+    assert 9585058 <= bits <= 9585059 and hashes == 7
+    bloom = BloomFilter(None, 'test', 1000, 0.01)
+    offsets = bloom.offsets('user:1')
+    assert offsets == bloom.offsets(b'user:1')
+    assert len(offsets) == bloom.hashes and all(0 <= offset < bloom.bits for offset in offsets)
+    print(bits, hashes, offsets)
+
+
+def test_iter_days():
+    assert list(iter_days(20201230, 20210102)) == [20201230, 20201231, 20210101, 20210102]
+
+
+if __name__ == '__main__':
+    test_bloom_parameters()
+    test_iter_days()
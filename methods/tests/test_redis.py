@@ -79,6 +79,132 @@ async def test_sorted_set(redis_client: RedisClient, name='test_sorted_set') ->
     print(await redis_client.delete(name))
 
 
+async def test_bridge(redis_client: RedisClient, name='test_bridge:') -> None:
+    from methods.bridge import export_from_redis, load_to_redis
+    from methods.files import read_csv, save_csv
+
+    print('-' * 16, 'bridge 测试', '-' * 16)
+    save_csv([[str(i), f'name{i}', str(i * 10)] for i in range(100)], 'template.csv', headers=['id', 'name', 'score'])
+    print((await load_to_redis(redis_client, 'template.csv', kind='hash', key=name, key_field='id')).to_dict())
+    print((await load_to_redis(
+        redis_client, 'template.csv', kind='zset', key=f'{name}zset', member_field='name', score_field='score'
+    )).to_dict())
+    print((await export_from_redis(redis_client, 'template_export.csv', match=f'{name}*')).to_dict())
+    print(len(read_csv('template_export.csv')))
+    for key in await redis_client.keys(f'{name}*'):
+        await redis_client.delete(key)
+
+
+async def test_pubsub(redis_client: RedisClient, name='test_pubsub') -> None:
+    import asyncio
+    from methods.pubsub import Subscriber
+
+    print('-' * 16, 'pubsub 测试', '-' * 16)
+    received = []
+
+    async def on_message(message):
+        received.append(message['data'])
+
+    async with Subscriber(redis_client, queue_size=100) as subscriber:
+        await subscriber.subscribe(name, on_message)
+        await subscriber.psubscribe(f'{name}:*', lambda message: received.append(message['channel']))
+        await asyncio.sleep(0.1)
+        print(await redis_client.publish(name, 'hello'))
+        print(await redis_client.publish(f'{name}:1', 'world'))
+        await asyncio.sleep(0.1)
+        print(received)
+        print(subscriber.stats())
+
+
+async def test_timeseries(redis_client: RedisClient, name='test_timeseries') -> None:
+    from methods.dt import timestamp
+    from methods.timeseries import TimeSeries
+
+    print('-' * 16, 'timeseries 测试', '-' * 16)
+    series = TimeSeries(redis_client, name, partition='hour', retention=3600)
+    end = timestamp()
+    start = end - 2 * 3600 * 1000
+    timestamps = list(range(start, end, 60 * 1000))
+    print(await series.add_many(timestamps, [float(i % 10) for i in range(len(timestamps))]))
+    print(await series.range(start, end))
+    print(await series.downsample(start, end, step=600 * 1000))
+    # 名称以 {name}: 开头的其他序列不受 trim 影响
+    child = TimeSeries(redis_client, f'{name}:core1', partition='hour')
+    await child.add_many(timestamps, [1.0] * len(timestamps))
+    print(await series.trim())
+    assert len((await child.range(start, end))[0]) == len(timestamps)
+    print(await child.delete(start, end))
+    print(await series.delete(start, end))
+
+
+async def test_probabilistic(redis_client: RedisClient, name='test_probabilistic') -> None:
+    from methods.probabilistic import BloomFilter, DailyActive, UniqueCounter
+
+    print('-' * 16, 'probabilistic 测试', '-' * 16)
+    counter = UniqueCounter(redis_client, name)
+    print(await counter.add([f'user{i % 1000}' for i in range(10000)], day=20210101))
+    print(await counter.add([f'user{i}' for i in range(500, 1500)], day=20210102))
+    print(await counter.count(20210101), await counter.count_range(20210101, 20210102))
+
+    active = DailyActive(redis_client, name)
+    await active.mark_many(range(0, 1000, 2), day=20210101)
+    await active.mark_many(range(0, 1000, 3), day=20210102)
+    print(await active.count(20210101), await active.count_range(20210101, 20210102))
+    print(await active.retained(20210101, 20210102), await active.is_active(6, 20210102))
+
+    bloom = BloomFilter(redis_client, name, capacity=10000, error_rate=0.01)
+    print(await bloom.add_many([f'item{i}' for i in range(100)]))
+    print(await bloom.contains_many(['item1', 'item99', 'missing']))
+    await bloom.clear()
+    for day in (20210101, 20210102):
+        await redis_client.delete(counter.key(day))
+        await redis_client.delete(active.key(day))
+
+
+async def test_writebehind(redis_client: RedisClient, name='test_writebehind') -> None:
+    from methods.writebehind import WriteBehind
+
+    print('-' * 16, 'write-behind 测试', '-' * 16)
+    async with WriteBehind(redis_client, 'template.journal', spill_threshold=100, batch_size=50) as writer:
+        for i in range(1000):
+            await writer.hset(name, f'field{i % 10}', i)
+        print(writer.stats())
+    print(writer.stats())
+    print(await redis_client.hgetall(name))
+    print(await redis_client.delete(name))
+
+
+async def test_blob(redis_client: RedisClient, name='test_blob') -> None:
+    import os
+    from methods.blob import BlobStore
+
+    print('-' * 16, 'blob 测试', '-' * 16)
+    store = BlobStore(redis_client, chunk_size=256 * 1024)
+    data = os.urandom(5 * 1024 * 1024 + 123)
+    print(await store.put(name, memoryview(data)))
+    print(bytes(await store.get(name)) == data)
+    print(await store.download(name, 'template_blob.bin'))
+    print(await store.upload(f'{name}_file', 'template_blob.bin'))
+    buffer = bytearray(len(data))
+    print(await store.read_into(f'{name}_file', buffer), bytes(buffer) == data)
+    print(await store.delete(name), await store.delete(f'{name}_file'))
+
+
+async def test_keyspace(redis_client: RedisClient, name='test_keyspace:') -> None:
+    from methods.keyspace import analyze_keyspace
+
+    print('-' * 16, 'keyspace 测试', '-' * 16)
+    for i in range(100):
+        await redis_client.hset(f'{name}user:{i}', 'name', f'name{i}')
+        await redis_client.setex(f'{name}cache:{i}', 60, 'x' * i)
+    report = await analyze_keyspace(redis_client, match=f'{name}*', ops_per_second=5000, depth=3, top=5)
+    print(report.to_dict()['types'])
+    print(report.pattern_rows())
+    report.save('template_keyspace')
+    for key in await redis_client.keys(f'{name}*'):
+        await redis_client.delete(key)
+
+
 async def main():
     redis_client = RedisClient()
     await test_string(redis_client)
@@ -87,6 +213,13 @@ async def main():
     await test_hash(redis_client)
     await test_set(redis_client)
     await test_sorted_set(redis_client)
+    await test_bridge(redis_client)
+    await test_pubsub(redis_client)
+    await test_timeseries(redis_client)
+    await test_probabilistic(redis_client)
+    await test_writebehind(redis_client)
+    await test_blob(redis_client)
+    await test_keyspace(redis_client)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+from methods.timeseries import _parse_members, np_downsample
+
+
+def test_downsample():
+    timestamps = np.array([0, 500, 1000, 1500, 3000, 250])
+    values = np.array([1.0, 3.0, 2.0, 6.0, 5.0, 2.0])
+    result = np_downsample(timestamps, values, 1000, aggregates=('min', 'max', 'avg', 'count', 'first', 'last'))
+    assert result['timestamp'].tolist() == [0, 1000, 3000]
+    assert result['min'].tolist() == [1.0, 2.0, 5.0]
+    assert result['max'].tolist() == [3.0, 6.0, 5.0]
+    assert result['avg'].tolist() == [2.0, 4.0, 5.0]
+    assert result['count'].tolist() == [3, 2, 1]
+    assert result['first'].tolist() == [1.0, 2.0, 5.0]
+    assert result['last'].tolist() == [3.0, 6.0, 5.0]
+    assert np_downsample([], [], 1000)['avg'].tolist() == []
+    print(result)
+
+
+def test_parse_members():
+    timestamps, values = _parse_members([b'1000:1.5', b'2000:-2.0', b'3000:nan'])
+    assert timestamps.tolist() == [1000, 2000, 3000]
+    assert values[:2].tolist() == [1.5, -2.0] and np.isnan(values[2])
+
+
+if __name__ == '__main__':
+    test_downsample()
+    test_parse_members()
@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+"""
+基于有序集合的时间序列
+
+数据点按小时或天分区写入不同的有序集合，分数为毫秒时间戳（与 methods.dt.timestamp 一致），
+成员为 "时间戳:值"。查询结果以 numpy 数组返回，降采样在 numpy 中向量化完成
+
+    series = TimeSeries(redis_client, 'cpu', partition='hour', retention=7 * 86400)
+    await series.add_many(timestamps, values)
+    timestamps, values = await series.range(start, end)
+    result = await series.downsample(start, end, step=60 * 1000)
+"""
+from __future__ import annotations
+
+import re
+import time
+
+from methods.dt import timestamp
+from methods.exceptions import MethodException
+from methods.lazy import lazy_import
+from methods.redis import RedisClient
+
+np = lazy_import('numpy')
+
+# 分区跨度，单位：毫秒
+PARTITIONS = {'hour': 3600 * 1000, 'day': 86400 * 1000}
+_LABEL_FORMATS = {'hour': '%Y%m%d%H', 'day': '%Y%m%d'}
+AGGREGATES = ('min', 'max', 'avg', 'sum', 'count', 'first', 'last')
+
+
+def _escape_pattern(value: str) -> str:
+    """
+    转义 SCAN MATCH 中的通配符
+    """
+    return re.sub(r'([\\*?\[\]])', r'\\\1', value)
+
+
+def _parse_members(members: list) -> tuple:
+    """
+    将 "时间戳:值" 格式的成员解析为 (时间戳数组, 值数组)
+    """
+    if not members:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+    sep = b':' if isinstance(members[0], bytes) else ':'
+    parts = np.char.partition(np.array(members), sep)
+    return parts[:, 0].astype(np.int64), parts[:, 2].astype(np.float64)
+
+
+def np_downsample(timestamps, values, step: int, aggregates=('min', 'max', 'avg')) -> dict:
+    """
+    按 step 毫秒对齐分桶并聚合，只返回有数据的桶
+
+    :param aggregates: min, max, avg, sum, count, first, last
+    :return:
+        字典，timestamp 为各桶起点，其余为对应聚合结果的数组
+    """
+    for aggregate in aggregates:
+        if aggregate not in AGGREGATES:
+            raise MethodException(f'不支持的聚合方式: {aggregate}')
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    values = np.asarray(values, dtype=np.float64)
+    if timestamps.shape != values.shape:
+        raise MethodException('时间戳与值的数量不一致')
+    if len(timestamps) > 1 and np.any(timestamps[1:] < timestamps[:-1]):
+        order = np.argsort(timestamps, kind='stable')
+        timestamps, values = timestamps[order], values[order]
+    buckets = timestamps - timestamps % step
+    if not len(buckets):
+        starts = np.empty(0, dtype=np.intp)
+    else:
+        starts = np.flatnonzero(np.concatenate(([True], buckets[1:] != buckets[:-1])))
+    ends = np.append(starts[1:], len(values))
+    counts = ends - starts
+    result = {'timestamp': buckets[starts]}
+    for aggregate in aggregates:
+        if not len(starts):
+            result[aggregate] = np.empty(0, dtype=np.int64 if aggregate == 'count' else np.float64)
+        elif aggregate == 'min':
+            result[aggregate] = np.minimum.reduceat(values, starts)
+        elif aggregate == 'max':
+            result[aggregate] = np.maximum.reduceat(values, starts)
+        elif aggregate == 'sum':
+            result[aggregate] = np.add.reduceat(values, starts)
+        elif aggregate == 'avg':
+            result[aggregate] = np.add.reduceat(values, starts) / counts
+        elif aggregate == 'count':
+            result[aggregate] = counts
+        elif aggregate == 'first':
+            result[aggregate] = values[starts]
+        else:
+            result[aggregate] = values[ends - 1]
+    return result
+
+
+class TimeSeries:
+    """
+    按时间分区存储在有序集合中的时间序列
+
+    :param partition: hour 或 day，每个分区为一个有序集合: {prefix}{name}:{YYYYMMDDHH 或 YYYYMMDD}（UTC）
+    :param retention: 数据保留时间（秒），写入时为分区设置过期时间，trim 删除过期的数据点
+    :param batch_size: 批量写入时每个管道包含的数据点数量
+    """
+
+    def __init__(
+            self, redis_client: RedisClient, name: str, partition='hour', retention: int = None,
+            prefix='ts:', batch_size=1000,
+    ) -> None:
+        if partition not in PARTITIONS:
+            raise MethodException(f'不支持的分区: {partition}')
+        self.redis_client = redis_client
+        self.name = name
+        self.partition = partition
+        self.span = PARTITIONS[partition]
+        self.retention = retention
+        self.prefix = prefix
+        self.batch_size = batch_size
+
+    def partition_key(self, partition_start: int) -> str:
+        label = time.strftime(_LABEL_FORMATS[self.partition], time.gmtime(partition_start // 1000))
+        return f'{self.prefix}{self.name}:{label}'
+
+    def key(self, ts: int) -> str:
+        """
+        时间戳（毫秒）所属分区的 key
+        """
+        return self.partition_key(ts - ts % self.span)
+
+    def keys(self, start: int, end: int) -> list:
+        """
+        覆盖 [start, end] 的所有分区 key
+        """
+        first = start - start % self.span
+        return [self.partition_key(item) for item in range(first, end + 1, self.span)]
+
+    async def add(self, value: float, ts: int = None) -> int:
+        """
+        写入一个数据点，ts 默认为当前时间戳（毫秒）
+        """
+        return await self.add_many([timestamp() if ts is None else ts], [value])
+
+    async def add_many(self, timestamps, values) -> int:
+        """
+        批量写入数据点，每 batch_size 个数据点按分区合并为一次 ZADD 并通过一个管道发送
+        :return:
+            新增的数据点数量
+        """
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        values = np.asarray(values, dtype=np.float64)
+        if timestamps.shape != values.shape:
+            raise MethodException('时间戳与值的数量不一致')
+        added = 0
+        for start in range(0, len(timestamps), self.batch_size):
+            chunk_ts = timestamps[start:start + self.batch_size]
+            chunk_values = values[start:start + self.batch_size]
+            groups = {}
+            for ts, value, partition_start in zip(
+                    chunk_ts.tolist(), chunk_values.tolist(), (chunk_ts - chunk_ts % self.span).tolist()
+            ):
+                groups.setdefault(partition_start, []).extend((ts, f'{ts}:{value!r}'))
+            async with await self.redis_client.pipeline() as pipe:
+                for partition_start, args in groups.items():
+                    key = self.partition_key(partition_start)
+                    await pipe.zadd(key, *args)
+                    if self.retention:
+                        await pipe.pexpireat(key, partition_start + self.span + self.retention * 1000)
+                results = await pipe.execute()
+            added += sum(results[::2] if self.retention else results)
+        return added
+
+    async def range(self, start: int, end: int) -> tuple:
+        """
+        查询 [start, end] 内的数据点
+        :return:
+            (时间戳数组, 值数组)，按时间排序
+        """
+        async with await self.redis_client.pipeline() as pipe:
+            for key in self.keys(start, end):
+                await pipe.zrangebyscore(key, start, end)
+            results = await pipe.execute()
+        return _parse_members([member for members in results for member in members])
+
+    async def downsample(self, start: int, end: int, step: int, aggregates=('min', 'max', 'avg')) -> dict:
+        """
+        查询 [start, end] 内的数据点并按 step 毫秒降采样，参考 np_downsample
+        """
+        timestamps, values = await self.range(start, end)
+        return np_downsample(timestamps, values, step, aggregates)
+
+    async def trim(self, now: int = None, count=1000) -> int:
+        """
+        删除超过保留时间的数据点，需要设置 retention
+        :return:
+            删除的数据点数量
+        """
+        if not self.retention:
+            raise MethodException('未设置 retention')
+        cutoff = (timestamp() if now is None else now) - self.retention * 1000
+        # 只匹配本序列的分区，名称以 {name}: 开头的其他序列不受影响
+        label_size = len(time.strftime(_LABEL_FORMATS[self.partition], time.gmtime(0)))
+        match = _escape_pattern(f'{self.prefix}{self.name}:') + '[0-9]' * label_size
+        removed = 0
+        cursor = 0
+        while True:
+            cursor, keys = await self.redis_client.scan(cursor=cursor, match=match, count=count)
+            if keys:
+                async with await self.redis_client.pipeline() as pipe:
+                    for key in keys:
+                        await pipe.zremrangebyscore(key, '-inf', f'({cutoff}')
+                    removed += sum(await pipe.execute())
+            if not cursor:
+                break
+        return removed
+
+    async def delete(self, start: int, end: int) -> int:
+        """
+        删除 [start, end] 覆盖的所有分区
+        """
+        async with await self.redis_client.pipeline() as pipe:
+            for key in self.keys(start, end):
+                await pipe.delete(key)
+            return sum(await pipe.execute())
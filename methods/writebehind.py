@@ -0,0 +1,339 @@
+# -*- coding: utf-8 -*-
+"""
+redis 写入缓冲（write-behind）
+
+写入先进入内存队列并立即返回，后台任务按顺序以管道批量写入 redis。
+内存队列达到 spill_threshold 后，排队中的写入及之后的新写入追加到本地日志文件（journal），
+redis 不可用时数据保留在日志中，恢复后按原顺序继续写入；进程重启后 start 会从上次的位置重放日志
+
+    async with WriteBehind(redis_client, 'redis.journal') as writer:
+        await writer.hset('user:1', 'name', '247gzs')
+        await writer.xadd('events', {'type': 'login'})
+
+所有写入严格按调用顺序发送，因此同一个 key 的写入顺序不变。
+批量写入失败时整批重试，属于至少一次语义，非幂等命令（如 xadd、incr）在故障时可能重复
+"""
+import asyncio
+import json
+import os
+from collections import deque
+from itertools import islice
+
+from methods.afiles import run_io
+from methods.exceptions import MethodException
+from methods.files import AtomicFile, BatchWriter, read_txt, save_txt
+from methods.logger import logger
+from methods.redis import RedisClient
+
+# 内存队列中的写入数量超过该值后转存到日志文件
+SPILL_THRESHOLD = 10000
+# 每个管道包含的写入数量
+BATCH_SIZE = 500
+# 写入失败后的重试等待时间（秒），指数增长至 MAX_RETRY_DELAY
+RETRY_DELAY = 0.5
+MAX_RETRY_DELAY = 30.0
+
+COMMANDS = frozenset((
+    'set', 'setex', 'delete', 'expire', 'incr', 'incrby', 'hset', 'hmset', 'hdel', 'hincrby',
+    'lpush', 'rpush', 'sadd', 'srem', 'zadd', 'zrem', 'zincrby', 'xadd', 'pfadd', 'setbit',
+))
+
+
+def _read_journal(filename: str, offset: int, limit: int) -> tuple:
+    """
+    从字节偏移量 offset 开始读取最多 limit 条完整的记录
+    :return:
+        (记录列表, 读取后的偏移量)
+    """
+    ops = []
+    with open(filename, 'rb') as fr:
+        fr.seek(offset)
+        while len(ops) < limit:
+            line = fr.readline()
+            if not line.endswith(b'\n'):
+                # 未写完整的行留到下次读取
+                break
+            offset += len(line)
+            if line.strip():
+                ops.append(json.loads(line))
+    return ops, offset
+
+
+def _count_journal(filename: str, offset: int) -> int:
+    count = 0
+    with open(filename, 'rb') as fr:
+        fr.seek(offset)
+        for line in fr:
+            if line.endswith(b'\n') and line.strip():
+                count += 1
+    return count
+
+
+class WriteBehind:
+    """
+    带本地日志的 redis 写入缓冲
+
+    :param journal: 日志文件路径，读取位置保存在 journal + '.offset'
+    :param spill_threshold: 内存队列的容量，超过后转存到日志
+    :param batch_size: 每个管道包含的写入数量
+    :param fsync: 日志每次落盘后是否 fsync
+    """
+
+    def __init__(
+            self, redis_client: RedisClient, journal: str, spill_threshold=SPILL_THRESHOLD, batch_size=BATCH_SIZE,
+            flush_interval=0.05, retry_delay=RETRY_DELAY, max_retry_delay=MAX_RETRY_DELAY, fsync=True,
+    ) -> None:
+        self.redis_client = redis_client
+        self.journal = journal
+        self.offset_file = f'{journal}.offset'
+        self.spill_threshold = spill_threshold
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.fsync = fsync
+        self.sent = 0
+        self.spilled = 0
+        self.errors = 0
+        self._queue = deque()
+        # 正在发送的内存队列头部的写入数量
+        self._inflight = 0
+        self._journal_pending = 0
+        self._offset = 0
+        self._writer = None
+        # 日志文件的追加、落盘、重写按获取顺序在磁盘线程中执行
+        self._journal_lock = None
+        self._wakeup = None
+        self._task = None
+        self._running = False
+
+    @property
+    def pending(self) -> int:
+        """
+        尚未写入 redis 的数量
+        """
+        return len(self._queue) + self._journal_pending
+
+    def stats(self) -> dict:
+        return {
+            'queued': len(self._queue),
+            'journal_pending': self._journal_pending,
+            'sent': self.sent,
+            'spilled': self.spilled,
+            'errors': self.errors,
+        }
+
+    async def start(self) -> None:
+        """
+        启动后台写入任务，存在未完成的日志时从上次的位置继续写入
+        """
+        if self._running:
+            return
+        self._wakeup = asyncio.Event()
+        self._journal_lock = asyncio.Lock()
+        if os.path.exists(self.journal):
+            if os.path.exists(self.offset_file):
+                self._offset = int((await run_io(read_txt, self.offset_file, compression=None))[0])
+            self._journal_pending = await run_io(_count_journal, self.journal, self._offset)
+            if self._journal_pending:
+                logger.info('write-behind replay: journal=%s\tpending=%d', self.journal, self._journal_pending)
+                self._wakeup.set()
+            else:
+                await run_io(self._reset_journal)
+        self._running = True
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self, timeout=5.0) -> None:
+        """
+        在 timeout 秒内尽量写完剩余数据，未写入的部分保存到日志，下次 start 时继续
+        """
+        if not self._running:
+            return
+        self._running = False
+        self._wakeup.set()
+        try:
+            await asyncio.wait_for(asyncio.shield(self._task), timeout)
+        except asyncio.TimeoutError:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        self._inflight = 0
+        async with self._journal_lock:
+            if self._queue:
+                lines = [json.dumps(item, ensure_ascii=False) for item in self._queue]
+                self.spilled += len(lines)
+                self._journal_pending += len(lines)
+                self._queue.clear()
+                await run_io(self._spill_all, lines)
+            if self._writer is not None:
+                await run_io(self._writer.close)
+                self._writer = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        await self.stop()
+
+    async def write(self, command: str, *args, **kwargs) -> None:
+        """
+        写入一条命令，参数与 aredis 对应的命令相同，需要可以 json 序列化
+
+        需要在 start 之后调用，start 之前无法得知日志中是否有更早的写入，无法保证顺序
+        """
+        if command not in COMMANDS:
+            raise MethodException(f'不支持的命令: {command}')
+        if not self._running:
+            raise MethodException('write-behind 未启动或已停止')
+        op = [command, args, kwargs]
+        if self._journal_pending or len(self._queue) >= self.spill_threshold:
+            await self._spill(op)
+        else:
+            self._queue.append(op)
+        self._wakeup.set()
+
+    async def set(self, key: str, value) -> None:
+        await self.write('set', key, value)
+
+    async def hset(self, name: str, key: str, value) -> None:
+        await self.write('hset', name, key, value)
+
+    async def hmset(self, name: str, mapping: dict) -> None:
+        await self.write('hmset', name, mapping)
+
+    async def xadd(self, name: str, entry: dict, max_len=None, stream_id='*') -> None:
+        await self.write('xadd', name, entry, max_len=max_len, stream_id=stream_id)
+
+    async def zadd(self, name: str, *args) -> None:
+        await self.write('zadd', name, *args)
+
+    async def expire(self, name: str, time: int) -> None:
+        await self.write('expire', name, time)
+
+    def _get_writer(self) -> BatchWriter:
+        if self._writer is None:
+            # 日志按行直接读取，不能压缩
+            self._writer = BatchWriter(
+                self.journal, batch_size=self.batch_size, flush_interval=self.flush_interval, fsync=self.fsync,
+                compression=None,
+            )
+        return self._writer
+
+    def _append_journal(self, lines: list) -> None:
+        self._get_writer().write(lines)
+
+    def _flush_journal(self) -> None:
+        self._get_writer().flush()
+
+    async def _spill(self, op: list) -> None:
+        # 除正在发送的部分外，内存中的写入都早于新写入，需要先转存以保证顺序
+        lines = [json.dumps(item, ensure_ascii=False) for item in islice(self._queue, self._inflight, None)]
+        for _ in range(len(lines)):
+            self._queue.pop()
+        lines.append(json.dumps(op, ensure_ascii=False))
+        # 先计数，之后的写入在落盘前也会转存到日志，保证顺序
+        self._journal_pending += len(lines)
+        self.spilled += len(lines)
+        async with self._journal_lock:
+            await run_io(self._append_journal, lines)
+
+    def _spill_all(self, lines: list) -> None:
+        """
+        将内存中剩余的写入保存到日志头部，内存中的写入总是早于日志中的写入
+        """
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if os.path.exists(self.journal):
+            with open(self.journal, 'rb') as fr:
+                fr.seek(self._offset)
+                lines.extend(line.decode('utf-8').rstrip('\n') for line in fr if line.strip())
+        with AtomicFile(self.journal, 'w', encoding='utf-8', compression=None) as fw:
+            fw.write(''.join(f'{line}\n' for line in lines))
+        self._save_offset(0)
+
+    def _save_offset(self, offset: int) -> None:
+        self._offset = offset
+        save_txt(str(offset), self.offset_file, compression=None, atomic=True)
+
+    def _reset_journal(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        for filename in (self.journal, self.offset_file):
+            if os.path.exists(filename):
+                os.remove(filename)
+        self._offset = 0
+
+    async def _next_batch(self) -> tuple:
+        """
+        内存队列中的写入早于日志中的写入，先发送内存队列
+        :return:
+            (写入列表, 来源 memory/journal, 日志读取后的偏移量)
+        """
+        if self._queue:
+            self._inflight = min(len(self._queue), self.batch_size)
+            return list(islice(self._queue, self._inflight)), 'memory', None
+        if self._journal_pending:
+            async with self._journal_lock:
+                await run_io(self._flush_journal)
+            ops, offset = await run_io(_read_journal, self.journal, self._offset, self.batch_size)
+            return ops, 'journal', offset
+        return [], None, None
+
+    async def _send(self, ops: list) -> None:
+        async with await self.redis_client.pipeline() as pipe:
+            for command, args, kwargs in ops:
+                await getattr(pipe, command)(*args, **kwargs)
+            # 单条命令的错误（如类型错误）不重试，只记录
+            results = await pipe.execute(raise_on_error=False)
+        errors = [item for item in results if isinstance(item, Exception)]
+        if errors:
+            self.errors += len(errors)
+            logger.warning('write-behind command failed: count=%d\tfirst=%r', len(errors), errors[0])
+
+    async def _commit(self, ops: list, source: str, offset) -> None:
+        self.sent += len(ops)
+        if source == 'memory':
+            for _ in range(self._inflight):
+                self._queue.popleft()
+            self._inflight = 0
+            return
+        self._journal_pending -= len(ops)
+        async with self._journal_lock:
+            if self._journal_pending <= 0:
+                # 日志已全部写入，删除日志并恢复为内存队列，等待锁的转存会写入新的日志
+                self._journal_pending = 0
+                await run_io(self._reset_journal)
+            else:
+                await run_io(self._save_offset, offset)
+
+    async def _run(self) -> None:
+        delay = self.retry_delay
+        while True:
+            ops, source, offset = await self._next_batch()
+            if not ops:
+                self._inflight = 0
+                if not self._running:
+                    break
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.flush_interval * 10)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            try:
+                await self._send(ops)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._inflight = 0
+                if not self._running:
+                    break
+                logger.warning('write-behind redis unavailable, retry in %.1fs: %r', delay, e)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.max_retry_delay)
+                continue
+            delay = self.retry_delay
+            await self._commit(ops, source, offset)